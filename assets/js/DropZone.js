@@ -53,6 +53,26 @@ export default class DropZone extends Component {
                         'wf_module': this.props.wfModuleId
                     }
                 },
+                // Big files go in parts, so a dropped connection only costs the part in flight
+                chunking: {
+                    enabled: true,
+                    partSize: 5 * 1024 * 1024,
+                    success: {
+                        endpoint: '/api/uploadfile',
+                        customHeaders: {
+                            'X-CSRFToken': csrfToken
+                        },
+                        params: {
+                            'wf_module': this.props.wfModuleId
+                        }
+                    }
+                },
+                resume: {
+                    enabled: true
+                },
+                retry: {
+                    enableAuto: true
+                },
                 validation: {
                     allowedExtensions: ['csv', 'CSV', 'xls', 'xlsx', 'XLS', 'XLSX']
                 },
@@ -12,6 +12,12 @@ class WorkbenchAPI {
       .then(response => response.json()))
   }
 
+  loadWfModule(wfModuleId) {
+    return (
+      fetch('/api/wfmodules/' + wfModuleId, { credentials: 'include'})
+      .then(response => response.json()))
+  }
+
   addModule(workflowId, moduleId, insertBefore) {
     return (
       fetch(
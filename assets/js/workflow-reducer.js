@@ -7,6 +7,7 @@ import promiseMiddleware from 'redux-promise'
 
 const CHANGE_PARAM = 'CHANGE_PARAM'
 const RELOAD_WORKFLOW = 'RELOAD_WORKFLOW'
+const RELOAD_WFMODULES = 'RELOAD_WFMODULES'
 const INITIAL_LOAD_WORKFLOW = 'INITIAL_LOAD_WORKFLOW'
 const REMOVE_MODULE_ACTION = 'REMOVE_MODULE'
 const MODULE_STATUS_CHANGE = 'MODULE_STATUS_CHANGE'
@@ -29,6 +30,14 @@ export function reloadWorkflowAction() {
   )
 }
 
+// Load just some modules, when only their state has changed. Returns a promise, like reloadWorkflowAction
+export function reloadWfModulesAction(wfModuleIDs) {
+  return (
+    Promise.all(wfModuleIDs.map(id => api.loadWfModule(id)))
+    .then(wfModules => ({ type: RELOAD_WFMODULES, wf_modules: wfModules }))
+  )
+}
+
 export function initialLoadWorkflowAction() {
   return (
     api.loadWorkflow(getPageID())
@@ -99,6 +108,22 @@ export function workflowReducer(state, action) {
         workflow: action.workflow
       });
 
+    // Replace the given modules, keeping their positions
+    case RELOAD_WFMODULES:
+      if (state.workflow && 'wf_modules' in state.workflow) {
+        var byId = {};
+        for (var reloaded of action.wf_modules) {
+          byId[reloaded.id] = reloaded;
+        }
+        return Object.assign({}, state, {
+          workflow: Object.assign({}, state.workflow, {
+            wf_modules: state.workflow.wf_modules.map(wfm => byId[wfm.id] || wfm)
+          })
+        });
+      } else {
+        return state;
+      }
+
     // Sets the selected module to the first in list
     case INITIAL_LOAD_WORKFLOW:
       console.log("INITIAL_LOAD_WORKFLOW");
@@ -63,7 +63,13 @@ socket.onmessage = function(e) {
         return
 
       case 'reload-workflow':
-        Actions.store.dispatch(Actions.reloadWorkflowAction());
+        // If the revision is unchanged and the server says which modules changed, fetch only those
+        var workflow = Actions.store.getState().workflow;
+        if (data.wf_module_ids !== undefined && workflow && data.revision == workflow.revision) {
+          Actions.store.dispatch(Actions.reloadWfModulesAction(data.wf_module_ids));
+        } else {
+          Actions.store.dispatch(Actions.reloadWorkflowAction());
+        }
         return
     }
   }
@@ -1,10 +1,13 @@
 # Websocket connection routing. Just send everything to our server.
+# Also background render jobs, see server/renderqueue.py
 
 from channels.routing import route
 from server.websockets import ws_add, ws_disconnect
+from server.renderqueue import RENDER_CHANNEL, render_workflow
 
 channel_routing = [
     route("websocket.connect", ws_add),
     route("websocket.disconnect", ws_disconnect),
+    route(RENDER_CHANNEL, render_workflow),
 ]
 
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 
 import os
 import sys
+import tempfile
 from os.path import abspath, basename, dirname, join, normpath
 from server.utils import user_display
 
@@ -28,6 +29,45 @@ SITE_NAME = basename(DJANGO_ROOT)
 SITE_ID = 1
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Rendered module output is cached in memory per process, and on disk next to the stored data for all processes
+RENDER_CACHE_MAX_ENTRIES = 100
+RENDER_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'rendercache/')
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('CJW_RENDER_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+if 'test' in sys.argv:
+    # tests render throwaway workflows; keep them out of the real cache
+    RENDER_CACHE_ROOT = os.path.join(tempfile.gettempdir(), 'cjworkbench-test-rendercache/')
+
+# Parts of chunked uploads, kept until the upload is complete (or abandoned this long)
+UPLOAD_PARTS_ROOT = os.path.join(MEDIA_ROOT, 'uploadparts/')
+UPLOAD_PARTS_MAX_AGE = 24 * 60 * 60                     # seconds
+
+# Queued render jobs are marked in a cache every process can see (see server/renderqueue.py). It is a database table,
+# created by `manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'render_jobs': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'render_job_cache',
+    },
+}
+
+# Python Code modules run in a pool of sandbox worker processes, with these limits per render
+PYTHONCODE_WORKERS = int(os.environ.get('CJW_PYTHONCODE_WORKERS', 2))
+PYTHONCODE_TIMEOUT = 30                                 # wall clock seconds
+PYTHONCODE_CPU_SECONDS = 20
+PYTHONCODE_MAX_MEMORY = 1024 * 1024 * 1024              # bytes, on top of what the worker uses before running code
+
+# Limits on fetching data from other servers (see server/fetch.py)
+FETCH_CONNECT_TIMEOUT = 10                              # seconds
+FETCH_READ_TIMEOUT = 60                                 # seconds without receiving anything
+FETCH_MAX_BYTES = int(os.environ.get('CJW_FETCH_MAX_BYTES', 100 * 1024 * 1024))
+FETCH_MAX_FILE_BYTES = int(os.environ.get('CJW_FETCH_MAX_FILE_BYTES', 1024 * 1024 * 1024))   # written to disk
+FETCH_MAX_PER_HOST = 4                                  # concurrent fetches, and kept-alive connections, per host
+FETCH_MAX_HOSTS = 50                                    # hosts to keep connections to
+GITHUB_CLONE_TIMEOUT = 120                              # seconds for importing a module from GitHub
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/1.10/howto/deployment/checklist/
 
@@ -52,6 +92,9 @@ if DEBUG==False:
     if 'CJW_DB_PASSWORD' not in os.environ:
         sys.exit('Must set CJW_DB_PASSWORD in production')
 
+    if 'CJW_REDIS_HOST' not in os.environ:
+        sys.exit('Must set CJW_REDIS_HOST in production')
+
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql_psycopg2',
@@ -167,12 +210,25 @@ REST_FRAMEWORK = {
 
 WSGI_APPLICATION = 'cjworkbench.wsgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'asgiref.inmemory.ChannelLayer',
-        'ROUTING': 'cjworkbench.routing.channel_routing',
-    },
-}
+# Websocket groups and render jobs must reach every process (web servers, workers, cron), so they go through Redis.
+# Without CJW_REDIS_HOST (development, tests) everything stays in this process.
+if 'CJW_REDIS_HOST' in os.environ:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'asgi_redis.RedisChannelLayer',
+            'ROUTING': 'cjworkbench.routing.channel_routing',
+            'CONFIG': {
+                'hosts': [(os.environ['CJW_REDIS_HOST'], int(os.environ.get('CJW_REDIS_PORT', 6379)))],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'asgiref.inmemory.ChannelLayer',
+            'ROUTING': 'cjworkbench.routing.channel_routing',
+        },
+    }
 
 
 
@@ -0,0 +1,61 @@
+# Chunked uploads
+# Fine Uploader sends big files in parts (see DropZone.js), each in its own request, then a request saying they're all
+# there. Parts are written to disk as they arrive, so a dropped connection only loses the part in flight and the
+# uploader resumes from there. Once all parts are in, they're joined into one file a part at a time, never holding the
+# whole file in memory.
+
+from django.conf import settings
+import os
+import shutil
+import time
+
+
+def part_directory(upload_uuid):
+    return os.path.join(settings.UPLOAD_PARTS_ROOT, str(upload_uuid))
+
+def part_path(upload_uuid, index):
+    return os.path.join(part_directory(upload_uuid), str(index))
+
+
+# Write part number index of an upload, from an UploadedFile. Sending a part again replaces it.
+def save_part(upload_uuid, index, file):
+    os.makedirs(part_directory(upload_uuid), exist_ok=True)
+
+    # write then rename, so a part whose request was cut off isn't mistaken for a whole one
+    path = part_path(upload_uuid, index)
+    with open(path + '.partial', 'wb') as f:
+        for chunk in file.chunks():
+            f.write(chunk)
+    os.replace(path + '.partial', path)
+
+
+# Join the parts of an upload into one file and return its path. Raises ValueError if parts are missing.
+def assemble_parts(upload_uuid, total_parts):
+    missing = [i for i in range(total_parts) if not os.path.isfile(part_path(upload_uuid, i))]
+    if missing:
+        raise ValueError('Upload is missing %d of %d parts' % (len(missing), total_parts))
+
+    path = os.path.join(part_directory(upload_uuid), 'assembled')
+    with open(path, 'wb') as f:
+        for i in range(total_parts):
+            with open(part_path(upload_uuid, i), 'rb') as part:
+                shutil.copyfileobj(part, f)
+            os.remove(part_path(upload_uuid, i))  # so we need disk space for one copy of the file, not two
+    return path
+
+
+def delete_parts(upload_uuid):
+    shutil.rmtree(part_directory(upload_uuid), ignore_errors=True)
+
+# Delete the parts of uploads nobody has added to in UPLOAD_PARTS_MAX_AGE
+def delete_abandoned_parts():
+    if not os.path.isdir(settings.UPLOAD_PARTS_ROOT):
+        return
+    oldest = time.time() - settings.UPLOAD_PARTS_MAX_AGE
+    for name in os.listdir(settings.UPLOAD_PARTS_ROOT):
+        directory = os.path.join(settings.UPLOAD_PARTS_ROOT, name)
+        try:
+            if os.path.getmtime(directory) < oldest:
+                shutil.rmtree(directory, ignore_errors=True)
+        except OSError:
+            pass  # deleted by someone else
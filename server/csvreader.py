@@ -0,0 +1,85 @@
+# Reading CSV into tables
+# Every module that reads CSV (LoadURL, Paste CSV, Upload, stored data from before Parquet) goes through read_csv()
+# here. It uses Arrow's multithreaded CSV parser where our pyarrow has one that can match pandas' type inference,
+# and pandas' parser otherwise. The pinned pyarrow (0.7.1, see requirements.txt) has no CSV parser, so for now every
+# read goes to pandas. Moving to a pyarrow with pyarrow.csv (0.15 or later) also means numpy >= 1.14, and checking
+# our Parquet and Arrow IPC code against it.
+#
+# Results should not depend on which parser ran, so anything Arrow doesn't do the way pandas does goes to pandas:
+# options Arrow has no equivalent for, CSV that Arrow rejects (e.g. rows with missing fields, which pandas fills with
+# NaN), and tables Arrow reads differently (see read_csv_arrow). Errors therefore come from pandas, as before:
+# CParserError for bad CSV. See `manage.py benchmark_csv` for how much faster Arrow is.
+
+import io
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import pyarrow.csv as pacsv
+    # Empty strings are NaN, as in pandas
+    ARROW_CONVERT_OPTIONS = pacsv.ConvertOptions(strings_can_be_null=True)
+    pacsv.ReadOptions(autogenerate_column_names=True)  # for header=None
+except (ImportError, TypeError):
+    pacsv = None  # older pyarrow: no CSV parser, or one we can't configure like pandas
+
+
+# Turn str, bytes or a binary file into something Arrow reads, or None if we can't
+def arrow_input(source):
+    if isinstance(source, str):
+        return pa.BufferReader(source.encode('utf-8'))
+    if isinstance(source, (bytes, bytearray)):
+        return pa.BufferReader(bytes(source))
+    if hasattr(source, 'read') and hasattr(source, 'seek'):
+        return source
+    return None
+
+
+# Raises ValueError for tables Arrow reads differently from pandas, which read_csv() leaves to pandas:
+#   dates, times and timestamps, which Arrow always infers and pandas leaves as text
+#   blank column names, which pandas calls 'Unnamed: N', and duplicate ones, which pandas renames
+#   integers too big for int64, which Arrow makes floats and pandas uint64 (or text)
+def read_csv_arrow(source, header):
+    read_options = pacsv.ReadOptions(autogenerate_column_names=(header is None))
+    arrow_table = pacsv.read_csv(source, read_options=read_options, convert_options=ARROW_CONVERT_OPTIONS)
+    for field in arrow_table.schema:
+        if pa.types.is_date(field.type) or pa.types.is_time(field.type) or pa.types.is_timestamp(field.type):
+            raise ValueError('Arrow reads column %s as dates' % field.name)
+
+    table = arrow_table.to_pandas()
+    if header is None:
+        table.columns = range(len(table.columns))  # pandas numbers them
+    elif '' in table.columns or len(set(table.columns)) != len(table.columns):
+        raise ValueError('Blank or duplicate column names')
+
+    for column in table.columns:
+        if table[column].dtype == np.float64 and (table[column].abs() >= 2 ** 63).any():
+            raise ValueError('Arrow reads column %s as floats' % column)
+    return table
+
+
+def read_csv_pandas(source, header, skipinitialspace):
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    elif isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return pd.read_csv(source, header=header, skipinitialspace=skipinitialspace)
+
+
+# Parse CSV from a str, bytes or binary file into a DataFrame, like pd.read_csv with these options.
+# header is 0 (first row is column names) or None (no column names; columns are numbered).
+# Raises pandas' CParserError (a ValueError) on CSV we can't read.
+def read_csv(source, header=0, skipinitialspace=False, use_arrow=True):
+    if use_arrow and pacsv is not None and not skipinitialspace:
+        arrow_source = arrow_input(source)
+        if arrow_source is not None:
+            start = source.tell() if arrow_source is source else None
+            try:
+                return read_csv_arrow(arrow_source, header)
+            except (pa.ArrowException, ValueError):
+                pass  # pandas will say what's wrong, or read it after all
+
+            if start is not None:
+                source.seek(start)
+
+    return read_csv_pandas(source, header, skipinitialspace)
@@ -2,23 +2,148 @@
 
 from server.models import Workflow, Module, WfModule, ParameterVal
 from server.dispatch import module_dispatch_render
+from server.rendercache import render_cache, RenderCache
+from functools import lru_cache
+import hashlib
+import json
+import os
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 
-# Return the output of a particular module. No caching yet...
-def execute_wfmodule(wfmodule):
-    table = pd.DataFrame()
-    workflow = wfmodule.workflow
-    for wfm in workflow.wf_modules.all():
-        table = module_dispatch_render(wfm, table)
+
+# ---- Render cache ----
+# Each WfModule's output is cached under a fingerprint of everything that can change that output. Because each
+# fingerprint includes the fingerprint of the module above it, a change at step N changes the fingerprints of N and
+# everything below it, and only those steps are re-executed.
+
+# Hash of our own code, which renders also depend on: the server package (built-in modules, csv parsing...) and the
+# pandas and pyarrow versions. After a deploy that changes any of it, nothing cached by the old code matches, and the
+# old disk cache files age out.
+@lru_cache(maxsize=None)
+def code_version():
+    h = hashlib.sha1()
+    h.update(('%s|%s' % (pd.__version__, pa.__version__)).encode('utf-8'))
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    for dirpath, dirnames, filenames in os.walk(server_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in ('tests', 'migrations', '__pycache__'))
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                h.update(os.path.relpath(os.path.join(dirpath, filename), server_dir).encode('utf-8'))
+                with open(os.path.join(dirpath, filename), 'rb') as f:
+                    h.update(f.read())
+    return h.hexdigest()
+
+
+# Hash of everything that determines a WfModule's output: the code that runs, its parameters, its stored data,
+# and the fingerprint of its input (the module above it, or '' for the first module)
+# Loads the module's parameter snapshot, which render then reads from.
+def wfmodule_fingerprint(wfm, input_fingerprint):
+    h = hashlib.sha1()
+    h.update(code_version().encode('utf-8'))
+    h.update(input_fingerprint.encode('utf-8'))
+
+    module_version = wfm.module_version
+    if module_version is not None:
+        h.update(('%d|%s|%s' % (module_version.id,
+                                module_version.module.dispatch,
+                                module_version.source_version_hash)).encode('utf-8'))
+
+    # as JSON, so no parameter value can read as the end of one parameter and the start of another
+    h.update(json.dumps(list(wfm.load_parameters().id_values())).encode('utf-8'))
+
+    if wfm.stored_data_version is not None:
+        h.update(wfm.stored_data_version.isoformat().encode('utf-8'))
+
+    return h.hexdigest()
+
+
+# Fingerprint every module in the workflow down to (and including) the given one. Returns (wfms, fingerprints)
+def fingerprint_stack(wfmodule):
+    wfms = []
+    fingerprints = []
+    fingerprint = ''
+    for wfm in wfmodule.workflow.wf_modules.all():
+        fingerprint = wfmodule_fingerprint(wfm, fingerprint)
+        wfms.append(wfm)
+        fingerprints.append(fingerprint)
         if wfm == wfmodule:
             break
+    return wfms, fingerprints
 
-    if table is None:
-        table = pd.DataFrame()
 
-    return table
+# Silently clips row indices to the table, defaulting to all rows
+def clip_rows(nrows, startrow, endrow):
+    if startrow is None:
+        startrow = 0
+    if endrow is None:
+        endrow = nrows
+
+    startrow = max(0, startrow)
+    endrow = min(nrows, endrow)
+    return startrow, endrow
+
 
+# Raised when a render is abandoned part way through, because its cancelled() callback returned True
+class RenderCancelled(Exception):
+    pass
 
 
+# Return the output of a particular module. Re-executes only the modules whose fingerprint is not in the cache.
+# cancelled, if given, is called before each module executes; if it returns True we stop with RenderCancelled.
+# Outputs of the modules that did execute stay cached, they are still valid for their fingerprints.
+def execute_wfmodule(wfmodule, cancelled=None):
+    wfms, fingerprints = fingerprint_stack(wfmodule)
+    return execute_stack(wfms, fingerprints, cancelled)
 
+
+# Return (rows startrow:endrow of the output of a module, total rows in the output), with indices clipped as by
+# clip_rows. If the output is cached, only the requested rows are loaded, so a page of a huge table is cheap.
+def execute_wfmodule_window(wfmodule, startrow=None, endrow=None):
+    wfms, fingerprints = fingerprint_stack(wfmodule)
+
+    if fingerprints:
+        # the cache clips endrow itself, once it knows the row count
+        first = max(0, startrow) if startrow is not None else 0
+        cached = render_cache.get_window(fingerprints[-1], first, endrow)
+        if cached is not RenderCache.MISS:
+            table, total_rows = cached
+            if table is None:
+                table = pd.DataFrame()
+            return table, total_rows
+
+    table = execute_stack(wfms, fingerprints)
+    startrow, endrow = clip_rows(len(table), startrow, endrow)
+    return table.iloc[startrow:endrow], len(table)
+
+
+# Render a stack of modules from fingerprint_stack, starting below the lowest module with cached output
+def execute_stack(wfms, fingerprints, cancelled=None):
+    # find the lowest module whose output we already have, and render from the one after it
+    table = pd.DataFrame()
+    start = 0
+    for i in reversed(range(len(wfms))):
+        cached = render_cache.get(fingerprints[i])
+        if cached is not RenderCache.MISS:
+            table = cached
+            start = i + 1
+            break
+
+    errored = False
+    for wfm, fingerprint in zip(wfms[start:], fingerprints[start:]):
+        if cancelled is not None and cancelled():
+            raise RenderCancelled()
+
+        table = module_dispatch_render(wfm, table)
+
+        # Don't cache errors, so the error message is always regenerated by the module that caused it. Nor anything
+        # below one: those outputs were rendered from the errored module's output, which a re-render may not reproduce.
+        if wfm.status == WfModule.ERROR:
+            errored = True
+        if not errored:
+            render_cache.put(fingerprint, table)
+
+    if table is None:
+        table = pd.DataFrame()
+
+    return table
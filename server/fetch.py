@@ -0,0 +1,132 @@
+# Shared HTTP client for modules that fetch data (LoadURL, Enigma...)
+# One requests Session for the whole process, so connections to each host are kept alive and reused across fetches
+# (scheduled updates of the same site don't redo TCP and TLS handshakes every time). Every fetch has connect and read
+# timeouts, so a slow server can't hang a worker forever, a maximum response size, and a limit on how many fetches
+# from one host run at once. Bodies too big for memory can go to a temporary file instead (spool_body), where the
+# limit is higher.
+#
+# The session is shared by every user's fetches, so it keeps no cookies: one site's cookies for one user's fetch
+# must not go out with another user's. With nothing stored between requests, all that threads share is the
+# connection pool, which urllib3 makes thread-safe. Nothing here changes session state after it is set up.
+
+from contextlib import contextmanager
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+import hashlib
+import http.cookiejar
+import requests
+import tempfile
+import threading
+
+
+# Raised with a message suitable for showing to the user, e.g. through WfModule.set_error()
+class FetchError(Exception):
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+def session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))  # accept none
+            adapter = HTTPAdapter(pool_connections=settings.FETCH_MAX_HOSTS,
+                                  pool_maxsize=settings.FETCH_MAX_PER_HOST)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+# Semaphore limiting concurrent fetches from the host
+def host_slots(host):
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(settings.FETCH_MAX_PER_HOST)
+        return _host_slots[host]
+
+
+# Body of a response, a chunk at a time, at most max_bytes of it
+def iter_body(response, url, max_bytes):
+    length = response.headers.get('content-length')
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise FetchError('%s is too large (limit %d MB)' % (url, max_bytes // (1024 * 1024)))
+
+    size = 0
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                raise FetchError('%s is too large (limit %d MB)' % (url, max_bytes // (1024 * 1024)))
+            yield chunk
+    except requests.exceptions.Timeout:
+        raise FetchError('Timed out fetching %s' % url)
+    except requests.exceptions.RequestException as e:
+        raise FetchError('Error fetching %s: %s' % (url, str(e)))
+
+
+# GET url through the shared session, without reading the body: use as
+#   with fetch.open_url(url) as response:
+#       ...read_body(response, url) or spool_body(response, url)
+# Raises FetchError on timeouts and connection errors.
+@contextmanager
+def open_url(url, headers=None):
+    slots = host_slots(urlsplit(url).netloc.lower())
+    if not slots.acquire(timeout=settings.FETCH_READ_TIMEOUT):
+        raise FetchError('Too many requests to %s at once, try again later' % urlsplit(url).netloc)
+    try:
+        try:
+            response = session().get(url, headers=headers, stream=True,
+                                     timeout=(settings.FETCH_CONNECT_TIMEOUT, settings.FETCH_READ_TIMEOUT))
+        except requests.exceptions.Timeout:
+            raise FetchError('Timed out fetching %s' % url)
+        except requests.exceptions.RequestException as e:
+            raise FetchError('Error fetching %s: %s' % (url, str(e)))
+
+        try:
+            yield response
+        finally:
+            response.close()  # back to the pool, or discarded if we stopped reading part way through
+    finally:
+        slots.release()
+
+
+# Read the body into memory, after which .content, .text and .json() work as usual
+def read_body(response, url, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = settings.FETCH_MAX_BYTES
+    # what requests does itself when reading a body, so the rest of Response behaves as if stream=False
+    response._content = b''.join(iter_body(response, url, max_bytes))
+    response._content_consumed = True
+
+
+# Write the body to a temporary file, for bodies too big to hold in memory.
+# Returns (the file, positioned at the start, sha256 hex digest of the body).
+def spool_body(response, url, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = settings.FETCH_MAX_FILE_BYTES
+    file = tempfile.TemporaryFile()
+    try:
+        sha256 = hashlib.sha256()
+        for chunk in iter_body(response, url, max_bytes):
+            sha256.update(chunk)
+            file.write(chunk)
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+    return file, sha256.hexdigest()
+
+
+# GET url through the shared session. Returns a requests Response with its body already read.
+# Raises FetchError on timeouts, connection errors and responses over max_bytes.
+def get(url, headers=None, max_bytes=None):
+    with open_url(url, headers) as response:
+        read_body(response, url, max_bytes)
+    return response
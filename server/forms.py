@@ -1,15 +1,29 @@
+from django import forms
 from django.forms import ModelForm
-from server.models import StoredObject
+from server.models import StoredObject, WfModule
 
 class StoredObjectForm(ModelForm):
     class Meta:
         model = StoredObject
         fields = ['wf_module', 'file', 'name', 'size', 'uuid']
-    # qqfile = forms.FileField()
-    # qquuid = forms.CharField()
-    # qqfilename = forms.CharField()
-    # qqpartindex = forms.IntegerField(required=False)
-    # qqchunksize = forms.IntegerField(required=False)
-    # qqpartbyteoffset = forms.IntegerField(required=False)
-    # qqtotalfilesize = forms.IntegerField(required=False)
-    # qqtotalparts = forms.IntegerField(required=False)
\ No newline at end of file
+
+# One part of a chunked upload. Field names are Fine Uploader's (see DropZone.js)
+class UploadPartForm(forms.Form):
+    file = forms.FileField()
+    uuid = forms.UUIDField()
+    qqpartindex = forms.IntegerField(min_value=0)
+    qqtotalparts = forms.IntegerField(min_value=1)
+
+    def clean(self):
+        cleaned_data = super(UploadPartForm, self).clean()
+        if cleaned_data.get('qqpartindex', 0) >= cleaned_data.get('qqtotalparts', 1):
+            raise forms.ValidationError('Part index out of range')
+        return cleaned_data
+
+# Sent once all parts of a chunked upload are in
+class UploadDoneForm(forms.Form):
+    wf_module = forms.ModelChoiceField(queryset=WfModule.objects.all())
+    uuid = forms.UUIDField()
+    name = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=0, required=False)
+    qqtotalparts = forms.IntegerField(min_value=1)
@@ -1,6 +1,7 @@
 from .initmodules import load_module_from_dict
 from server.models import Module
 
+from django.conf import settings
 from django.forms import URLField
 from django.core.exceptions import ValidationError
 
@@ -260,7 +261,7 @@ def import_module_from_github(url):
 
     # pull contents from GitHub
     try:
-        git.Git().clone(url)
+        git.Git().clone(url, kill_after_timeout=settings.GITHUB_CLONE_TIMEOUT)
         # move this to correct directory, i.e. where this file is.
         shutil.move(os.path.join(ROOT_DIRECTORY, directory), os.path.join(CURRENT_PATH, directory))
     except (ValidationError, GitCommandError) as ve:
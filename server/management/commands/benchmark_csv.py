@@ -0,0 +1,60 @@
+# Measure CSV parsing throughput of server.csvreader.read_csv, with Arrow's parser (if our pyarrow has a usable one)
+# and with pandas'. The CSV is generated: numbers, short strings and some empty cells, like much of what users load.
+#
+#   python manage.py benchmark_csv --megabytes 100
+
+from django.core.management.base import BaseCommand
+from server.csvreader import read_csv, pacsv
+import numpy as np
+import pandas as pd
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CSV parsing, Arrow against pandas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megabytes', type=int, default=100, help='size of the CSV to parse')
+        parser.add_argument('--repeat', type=int, default=3, help='parses per parser; the fastest counts')
+
+    def make_csv(self, n_bytes):
+        rows = 100000
+        random = np.random.RandomState(0)
+        sample = pd.DataFrame({
+            'id': np.arange(rows),
+            'amount': random.uniform(0, 10000, rows).round(2),
+            'count': random.randint(0, 1000, rows),
+            'name': ['name %d' % i for i in random.randint(0, 5000, rows)],
+            'category': random.choice(['a', 'b', 'c', ''], rows),
+        })
+        header, body = sample.to_csv(index=False).split('\n', 1)
+        body = body.encode('utf-8')
+        copies = max(1, n_bytes // len(body))
+        return header.encode('utf-8') + b'\n' + body * copies
+
+    def time_parse(self, data, use_arrow, repeat):
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            table = read_csv(data, use_arrow=use_arrow)
+            seconds = time.time() - start
+            best = seconds if best is None else min(best, seconds)
+        return best, table
+
+    def handle(self, *args, **options):
+        data = self.make_csv(options['megabytes'] * 1024 * 1024)
+        megabytes = len(data) / (1024 * 1024)
+        self.stdout.write('%.1f MB of CSV' % megabytes)
+
+        pandas_seconds, pandas_table = self.time_parse(data, False, options['repeat'])
+        self.stdout.write('  pandas: %.2f s, %.1f MB/s' % (pandas_seconds, megabytes / pandas_seconds))
+
+        if pacsv is None:
+            self.stdout.write('  arrow:  not available in this pyarrow')
+            return
+
+        arrow_seconds, arrow_table = self.time_parse(data, True, options['repeat'])
+        self.stdout.write('  arrow:  %.2f s, %.1f MB/s (%.1fx)' %
+                          (arrow_seconds, megabytes / arrow_seconds, pandas_seconds / arrow_seconds))
+        if not arrow_table.equals(pandas_table):
+            self.stdout.write('  WARNING: arrow and pandas tables differ')
@@ -0,0 +1,61 @@
+# Measure how fast ws_send_workflow_update fans messages out to the clients watching a workflow, through whatever
+# channel layer is configured. Run against Redis (CJW_REDIS_HOST=...) to see what production will do.
+#
+#   python manage.py benchmark_ws_fanout --clients 100 --messages 1000
+
+from django.core.management.base import BaseCommand
+from channels import DEFAULT_CHANNEL_LAYER, channel_layers
+from server.models import Workflow
+from server.websockets import ws_send_workflow_update, ws_id_to_group
+import time
+import uuid
+
+
+class Command(BaseCommand):
+    help = 'Benchmark websocket fan-out through the configured channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100, help='sockets listening to the workflow')
+        parser.add_argument('--messages', type=int, default=1000, help='messages to send to the workflow')
+
+    def handle(self, *args, **options):
+        n_clients = options['clients']
+        n_messages = options['messages']
+        layer = channel_layers[DEFAULT_CHANNEL_LAYER].channel_layer
+
+        # a workflow that only exists for the benchmark (database ids start at 1); ws_send_workflow_update only
+        # needs its id
+        workflow = Workflow(id=0)
+        group = ws_id_to_group(workflow.id)
+        channels = ['benchmark.fanout.%s' % uuid.uuid4().hex for i in range(n_clients)]
+        for channel in channels:
+            layer.group_add(group, channel)
+
+        try:
+            send_seconds = 0.0
+            receive_seconds = 0.0
+            received = 0
+            for i in range(n_messages):
+                start = time.time()
+                ws_send_workflow_update(workflow, {'type': 'benchmark', 'n': i})
+                send_seconds += time.time() - start
+
+                # drain after each send, so no channel hits its capacity and drops messages
+                start = time.time()
+                for channel in channels:
+                    while True:
+                        name, message = layer.receive([channel], block=False)
+                        if name is None:
+                            break
+                        received += 1
+                receive_seconds += time.time() - start
+        finally:
+            for channel in channels:
+                layer.group_discard(group, channel)
+
+        expected = n_clients * n_messages
+        self.stdout.write('%s: %d messages to %d clients' % (layer.__class__.__module__, n_messages, n_clients))
+        self.stdout.write('  send:    %.1f messages/s (%.3f ms each)' %
+                          (n_messages / send_seconds, 1000 * send_seconds / n_messages))
+        self.stdout.write('  deliver: %.1f deliveries/s, %d of %d delivered' %
+                          (received / (send_seconds + receive_seconds), received, expected))
@@ -0,0 +1,31 @@
+# Long-running scheduler for auto-updating modules: fetches each module's data when its next_update comes due.
+# Schedulers claim modules under row locks (see server/updates.py), so run as many as you like, on as many hosts.
+#
+#   python manage.py runupdates --workers 8
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from server.updates import update_wfm_data_scan, seconds_until_next_update, UPDATE_BATCH_SIZE, UPDATE_WORKERS
+import time
+
+
+class Command(BaseCommand):
+    help = 'Fetch new data for auto-updating modules as it comes due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=UPDATE_WORKERS, help='fetches to run at once')
+        parser.add_argument('--max-sleep', type=float, default=60,
+                            help='longest to wait between checks, in seconds; modules can be scheduled at any time')
+
+    def handle(self, *args, **options):
+        while True:
+            n_fetched = update_wfm_data_scan(workers=options['workers'])
+            if n_fetched >= UPDATE_BATCH_SIZE:
+                continue    # there may be more due right now
+
+            wait = seconds_until_next_update()
+            if wait is None or wait > options['max_sleep']:
+                wait = options['max_sleep']
+
+            connection.close()  # don't hold a database connection while we sleep
+            time.sleep(wait)
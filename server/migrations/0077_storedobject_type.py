@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 10:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('server', '0076_auto_20171025_1551'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedobject',
+            name='type',
+            field=models.CharField(choices=[('text', 'Text'), ('parquet', 'Parquet')], default='text', max_length=16, verbose_name='type'),
+        ),
+    ]
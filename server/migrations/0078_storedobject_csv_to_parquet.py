@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import migrations
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+import io
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Modules whose .dat files hold fetched tables as CSV text
+TABLE_DISPATCHES = ['loadurl', 'twitter', 'enigma']
+
+
+# Rewrite fetched CSV text as Parquet, so render no longer re-parses CSV.
+# Anything that doesn't parse or doesn't convert stays as text, which StoredObject still reads.
+def csv_to_parquet(apps, schema_editor):
+    StoredObject = apps.get_model('server', 'StoredObject')
+    stored_objects = StoredObject.objects.filter(type='text',
+                                                 file__endswith='.dat',
+                                                 wf_module__module_version__module__dispatch__in=TABLE_DISPATCHES)
+
+    for so in stored_objects.iterator():
+        try:
+            so.file.open(mode='rb')
+            text = bytearray(so.file.read()).decode('UTF-8')
+            so.file.close()
+            if len(text) == 0:
+                continue
+            table = pd.read_csv(io.StringIO(text))
+            if not all(isinstance(c, str) for c in table.columns):
+                continue
+            buf = io.BytesIO()
+            pq.write_table(pa.Table.from_pandas(table), buf)
+        except Exception:
+            continue
+
+        old_path = so.file.path
+        so.file = default_storage.save(os.path.basename(old_path)[:-len('.dat')] + '.parquet', ContentFile(buf.getvalue()))
+        so.type = 'parquet'
+        so.save()
+        os.remove(old_path)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('server', '0077_storedobject_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(csv_to_parquet, migrations.RunPython.noop)
+    ]
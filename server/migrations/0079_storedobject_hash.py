@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import migrations, models
+import hashlib
+
+
+# Hash existing fetched data so change detection and deduplication work on it too.
+# Uploaded files (which keep their original names) stay unhashed.
+def hash_stored_objects(apps, schema_editor):
+    StoredObject = apps.get_model('server', 'StoredObject')
+    stored_objects = StoredObject.objects.filter(models.Q(type='parquet') | models.Q(file__endswith='.dat'))
+
+    for so in stored_objects.iterator():
+        h = hashlib.sha256()
+        try:
+            so.file.open(mode='rb')
+            for chunk in so.file.chunks():
+                h.update(chunk)
+            so.file.close()
+        except (IOError, OSError):
+            continue
+        so.hash = h.hexdigest()
+        so.save(update_fields=['hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('server', '0078_storedobject_csv_to_parquet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedobject',
+            name='hash',
+            field=models.CharField(db_index=True, default=None, max_length=64, null=True, verbose_name='hash'),
+        ),
+        migrations.RunPython(hash_stored_objects, migrations.RunPython.noop),
+    ]
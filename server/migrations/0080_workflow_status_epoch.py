@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 10:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('server', '0079_storedobject_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflow',
+            name='status_epoch',
+            field=models.CharField(default='', max_length=32, verbose_name='status_epoch'),
+        ),
+    ]
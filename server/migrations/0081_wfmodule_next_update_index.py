@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 10:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('server', '0080_workflow_status_epoch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='wfmodule',
+            name='next_update',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
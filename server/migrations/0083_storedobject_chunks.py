@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 10:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('server', '0082_wfmodule_fetch_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedobject',
+            name='chunks',
+            field=models.TextField(blank=True, default=None, null=True, verbose_name='chunks'),
+        ),
+        migrations.AlterField(
+            model_name='storedobject',
+            name='type',
+            field=models.CharField(choices=[('text', 'Text'), ('parquet', 'Parquet'), ('chunked', 'Parquet chunks')], default='text', max_length=16, verbose_name='type'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from server.models.ParameterSpec import *
+from collections import namedtuple
 
 # A parameter value, which might be string or float
 class ParameterVal(models.Model):
@@ -137,3 +138,72 @@ class ParameterVal(models.Model):
 
     def __str__(self):
         return self.wf_module.__str__() + ' - ' + self.parameter_spec.name + ' - ' + str(self.get_value())
+
+
+# Read-only copy of all of a WfModule's parameter values, loaded in one query. Modules read their parameters many
+# times per render; WfModule.get_param_* read from a snapshot instead of querying spec and value each time.
+class ParameterSnapshot:
+    Entry = namedtuple('Entry', ['id', 'type', 'value', 'menu_items'])
+
+    def __init__(self, entries):
+        self._entries = dict(entries)   # id_name -> Entry
+
+    @staticmethod
+    def load(wf_module):
+        pvals = ParameterVal.objects.filter(wf_module=wf_module) \
+                                    .values_list('id', 'parameter_spec__id_name', 'parameter_spec__type',
+                                                 'value', 'menu_items')
+        return ParameterSnapshot((p[1], ParameterSnapshot.Entry(p[0], p[2], p[3], p[4])) for p in pvals)
+
+    # (ParameterVal id, value) of every parameter, in id order
+    def id_values(self):
+        return sorted((e.id, e.value) for e in self._entries.values())
+
+    def get_raw(self, name, expected_type):
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ValueError('Request for non-existent ' + expected_type + ' parameter ' + name)
+        if entry.type != expected_type:
+            raise ValueError('Request for ' + expected_type + ' parameter ' + name + ' but actual type is ' + entry.type)
+        return entry.value
+
+    def get_string(self, name):
+        return self.get_raw(name, ParameterSpec.STRING)
+
+    def get_integer(self, name):
+        return int(self.get_raw(name, ParameterSpec.INTEGER))
+
+    def get_float(self, name):
+        return float(self.get_raw(name, ParameterSpec.FLOAT))
+
+    def get_checkbox(self, name):
+        return self.get_raw(name, ParameterSpec.CHECKBOX) == 'True'
+
+    def get_column(self, name):
+        return self.get_raw(name, ParameterSpec.COLUMN)
+
+    def get_multicolumn(self, name):
+        return self.get_raw(name, ParameterSpec.MULTICOLUMN)
+
+    # Same as ParameterVal.selected_menu_item_idx/selected_menu_item_string
+    def get_menu_idx(self, name):
+        return int(self.__menu_entry(name).value)
+
+    def get_menu_string(self, name):
+        entry = self.__menu_entry(name)
+        items = entry.menu_items
+        if (items is not None):
+            items = items.split('|')
+            idx = int(entry.value)
+            if items != [''] and idx >=0 and idx < len(items):
+                return items[idx]
+            else:
+                return ''  # return empty if bad idx, to allow for possible errors when menu items changed
+
+    def __menu_entry(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ValueError('Request for non-existent menu parameter ' + name)
+        if entry.type != ParameterSpec.MENU:
+            raise ValueError('Request for current item of non-menu parameter ' + name)
+        return entry
@@ -3,12 +3,29 @@ from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.dispatch import receiver
 from django.utils import timezone
+import hashlib
+import io
+import json
 import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from server.csvreader import read_csv
 
 
 # StoredObject is our persistence layer.
 # Allows WfModules to store keyed, versioned binary objects
 class StoredObject(models.Model):
+    # Payload formats
+    TEXT = 'text'           # UTF-8 text. Tables fetched before we had Parquet are CSV text.
+    PARQUET = 'parquet'     # A table, with dtypes preserved
+    CHUNKED = 'chunked'     # A table appended to over time, stored as Parquet chunks listed in `chunks`
+    TYPE_CHOICES = (
+        (TEXT, 'Text'),
+        (PARQUET, 'Parquet'),
+        (CHUNKED, 'Parquet chunks')
+    )
+
     # delete stored data if WfModule deleted
     wf_module = models.ForeignKey('WfModule', related_name='stored_objects', on_delete=models.CASCADE)
     file = models.FileField()
@@ -16,37 +33,185 @@ class StoredObject(models.Model):
     name = models.CharField('name', default=None, max_length=255, null=True)
     size = models.IntegerField('size', default=None, null=True)
     uuid = models.CharField('uuid', default=None, max_length=255, null=True)
+    type = models.CharField('type', max_length=16, choices=TYPE_CHOICES, default=TEXT)
+
+    # sha256 of the file contents. Files are named by hash, and StoredObjects with identical contents share a file.
+    # Null for uploaded files, which keep their original names.
+    hash = models.CharField('hash', max_length=64, default=None, null=True, db_index=True)
+
+    # For CHUNKED objects (which have no file of their own), JSON list of [file name, type, row count] per chunk,
+    # newest rows first. Chunk files are stored like the files of other StoredObjects, and shared between the versions
+    # of a table: appending rows writes a file with just the new rows, and a new StoredObject listing it first.
+    chunks = models.TextField('chunks', default=None, null=True, blank=True)
 
     @staticmethod
-    def __filename_for_id(id):
-        return str(id) + '.dat'
+    def __filename_for_hash(hash, type):
+        if type == StoredObject.PARQUET:
+            return hash + '.parquet'
+        return hash + '.dat'
 
     @staticmethod
     def create(wf_module, text):
-        file = default_storage.save(StoredObject.__filename_for_id(wf_module.id), ContentFile(bytes(text, 'UTF-8')))
-        return StoredObject.objects.create(wf_module=wf_module, file=file, stored_at=timezone.now())
+        return StoredObject.create_from_payload(wf_module, StoredObject.TEXT, bytes(text, 'UTF-8'))
+
+    @staticmethod
+    def create_table(wf_module, table):
+        type, data = StoredObject.table_to_payload(table)
+        return StoredObject.create_from_payload(wf_module, type, data)
+
+    # Serialize a table to (type, bytes). Tables are stored as Parquet, except those Parquet can't represent
+    # (non-string column names, object columns of mixed types), which are stored as CSV text as before we had Parquet
+    @staticmethod
+    def table_to_payload(table):
+        try:
+            return (StoredObject.PARQUET, table_to_parquet_bytes(table))
+        except (ValueError, TypeError, pa.ArrowException):
+            return (StoredObject.TEXT, bytes(table.to_csv(index=False), 'UTF-8'))
+
+    @staticmethod
+    def payload_hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    # Store bytes, sharing the file with any existing StoredObject that has the same contents
+    @staticmethod
+    def create_from_payload(wf_module, type, data):
+        hash = StoredObject.payload_hash(data)
+        existing = StoredObject.objects.filter(hash=hash, type=type).first()
+        if existing is not None and os.path.isfile(existing.file.path):
+            file = existing.file.name
+        else:
+            file = default_storage.save(StoredObject.__filename_for_hash(hash, type), ContentFile(data))
+        return StoredObject.objects.create(wf_module=wf_module, file=file, stored_at=timezone.now(),
+                                           type=type, hash=hash)
+
+    # Store table rows (newer than all rows in base, a StoredObject or None) as a new version with base's rows
+    # after them. Only the new rows are written, so the cost depends on the number of new rows, not on the total.
+    # To keep the number of chunks down, a chunk with at least as many rows as the one before it is merged with it:
+    # chunks get bigger with age, there are O(log rows) of them, and each row is rewritten O(log rows) times.
+    @staticmethod
+    def append_table(wf_module, base, table):
+        if base is None:
+            chunks = []
+        elif base.type == StoredObject.CHUNKED:
+            chunks = base.get_chunks()
+        else:
+            # data stored before we appended; converted once (merged into the new chunk below if it's no bigger)
+            old_table = base.get_table()
+            if old_table is None:
+                chunks = []
+            elif len(table) >= len(old_table):
+                table = pd.concat([table, old_table], ignore_index=True)
+                chunks = []
+            else:
+                chunks = [StoredObject.__save_chunk(old_table)]
+
+        # The new rows merge with each chunk no bigger than what we have so far. Merge in memory and write once, so
+        # the only new file is the one this version lists.
+        n_merged = 0
+        rows = len(table)
+        while n_merged < len(chunks) and rows >= chunks[n_merged][2]:
+            rows += chunks[n_merged][2]
+            n_merged += 1
+        if n_merged > 0:
+            table = pd.concat([table] + [StoredObject.__read_chunk(chunk) for chunk in chunks[:n_merged]],
+                              ignore_index=True)
+        chunks[0:n_merged] = [StoredObject.__save_chunk(table)]
+
+        chunks_json = json.dumps(chunks)
+        return StoredObject.objects.create(wf_module=wf_module, file='', stored_at=timezone.now(),
+                                           type=StoredObject.CHUNKED, chunks=chunks_json,
+                                           hash=StoredObject.payload_hash(chunks_json.encode('utf-8')))
+
+    # [file name, type, row count] for each chunk of a CHUNKED object, newest first
+    def get_chunks(self):
+        return json.loads(self.chunks)
+
+    # Write a table as a chunk, sharing the file with any identical chunk or StoredObject. Returns its chunks entry
+    @staticmethod
+    def __save_chunk(table):
+        type, data = StoredObject.table_to_payload(table)
+        filename = StoredObject.__filename_for_hash(StoredObject.payload_hash(data), type)
+        if not default_storage.exists(filename):
+            default_storage.save(filename, ContentFile(data))
+        return [filename, type, len(table)]
+
+    @staticmethod
+    def __read_chunk(chunk):
+        filename, type, rows = chunk
+        if type == StoredObject.PARQUET:
+            return read_parquet(default_storage.path(filename))
+        with default_storage.open(filename, 'rb') as f:
+            return read_csv(f)
 
     def get_data(self):
+        if self.type in (StoredObject.PARQUET, StoredObject.CHUNKED):
+            return self.get_table().to_csv(index=False)
+
         self.file.open(mode='rb')
         data = self.file.read()
         self.file.close()
         # copy to bytearray as data is a memoryview in prod, which has no decode method
         return bytearray(data).decode('UTF-8')
 
-    # make a deep copy for another WfModule
+    # Returns the stored table, or None if there is nothing stored
+    def get_table(self):
+        if self.type == StoredObject.CHUNKED:
+            chunks = self.get_chunks()
+            if len(chunks) == 1:
+                return StoredObject.__read_chunk(chunks[0])
+            return pd.concat([StoredObject.__read_chunk(chunk) for chunk in chunks], ignore_index=True)
+
+        if self.type == StoredObject.PARQUET:
+            return read_parquet(self.file.path)
+
+        text = self.get_data()
+        if len(text) == 0:
+            return None
+        return read_csv(text)
+
+    # copy for another WfModule. Hashed files are shared rather than copied.
     def duplicate(self, to_wf_module):
-        if self.file.url.endswith('.dat'):
-            new_file = default_storage.save(StoredObject.__filename_for_id(to_wf_module.id), self.file)
+        if self.hash is not None:
+            new_file = self.file.name
         else:
             new_file = default_storage.save(self.file.url, self.file)
         new_so = StoredObject.objects.create(wf_module=to_wf_module,
                                              stored_at=self.stored_at,
-                                             file = new_file)
+                                             file = new_file,
+                                             type = self.type,
+                                             hash = self.hash,
+                                             chunks = self.chunks)
         return new_so
 
+
+def table_to_parquet_bytes(table):
+    if not all(isinstance(c, str) for c in table.columns):
+        raise ValueError('Parquet column names must be strings')
+    buf = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(table), buf)
+    return buf.getvalue()
+
+
+def read_parquet(path):
+    # memory map, so Arrow can build columns straight from the page cache
+    source = pa.memory_map(path, 'r')
+    try:
+        return pq.read_table(source).to_pandas()
+    finally:
+        source.close()
+
+
 @receiver(models.signals.post_delete, sender=StoredObject)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
-    # Deletes file from filesystem when corresponding `StoredObject` object is deleted.
-    if instance.file:
+    # Deletes file from filesystem when corresponding `StoredObject` object is deleted,
+    # unless another StoredObject with the same contents still uses it
+    if instance.file and not StoredObject.objects.filter(file=instance.file.name).exists() \
+            and not StoredObject.objects.filter(chunks__contains=instance.file.name).exists():
         if os.path.isfile(instance.file.path):
-            os.remove(instance.file.path)
\ No newline at end of file
+            os.remove(instance.file.path)
+
+    # Chunks may be listed by other versions of the table too (or be the file of a Parquet StoredObject)
+    if instance.type == StoredObject.CHUNKED:
+        for filename, type, rows in instance.get_chunks():
+            if not StoredObject.objects.filter(models.Q(file=filename) | models.Q(chunks__contains=filename)).exists():
+                default_storage.delete(filename)
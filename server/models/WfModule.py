@@ -65,10 +65,13 @@ class WfModule(models.Model):
 
     # For modules that fetch data: how often do we check for updates, and do we switch to latest version automatically
     auto_update_data = models.BooleanField(default='False')
-    next_update = models.DateTimeField(null=True, blank=True)    # when should next update run?
+    next_update = models.DateTimeField(null=True, blank=True, db_index=True)    # when should next update run?
     update_interval = models.IntegerField(default=0)             # time in seconds between updates
     last_update_check = models.DateTimeField(null=True, blank=True)
 
+    # How the stored data was fetched, as JSON, so later fetches can skip work if nothing changed (see modules/utils)
+    fetch_validators = models.TextField(null=True, blank=True)
+
     # status light and current error message
     READY = "ready"
     BUSY = "busy"
@@ -109,6 +112,32 @@ class WfModule(models.Model):
         else:
             return None
 
+    # Like store_data/retrieve_data, but for tables, which are stored in a binary format that keeps dtypes
+    def store_table(self, table):
+        stored_object = StoredObject.create_table(self, table)
+        return stored_object.stored_at
+
+    def retrieve_table(self):
+        if self.stored_data_version:
+            return StoredObject.objects.get(wf_module=self, stored_at=self.stored_data_version).get_table()
+        else:
+            return None
+
+    # Hash of the current stored data, so callers can tell whether new data differs without reading the old data
+    def retrieve_data_hash(self):
+        if self.stored_data_version:
+            return StoredObject.objects.filter(wf_module=self, stored_at=self.stored_data_version) \
+                                       .values_list('hash', flat=True).first()
+        else:
+            return None
+
+    # The StoredObject holding the current data, or None
+    def retrieve_stored_object(self):
+        if self.stored_data_version:
+            return StoredObject.objects.filter(wf_module=self, stored_at=self.stored_data_version).first()
+        else:
+            return None
+
     def retrieve_file(self):
         if self.stored_data_version:
             return StoredObject.objects.get(wf_module=self, stored_at=self.stored_data_version).file
@@ -141,52 +170,46 @@ class WfModule(models.Model):
 
     # Retrieve current parameter values.
     # Should never throw ValueError on type conversions because ParameterVal.set_value coerces
+    # During a render, values come from the snapshot execute.py loads with load_parameters(), so reading parameters
+    # costs no queries. Otherwise each call loads a fresh snapshot, so callers always see the current values.
 
-    def get_param_raw(self, name, expected_type):
-        try:
-            pspec = ParameterSpec.objects.get(module_version=self.module_version, id_name=name)
-        except ParameterSpec.DoesNotExist:
-            raise ValueError('Request for non-existent ' + expected_type + ' parameter ' + name)
+    # Load all parameter values in one query, and use them for all get_param_* calls on this object from now on
+    def load_parameters(self):
+        self.parameters = ParameterSnapshot.load(self)
+        return self.parameters
 
-        if pspec.type != expected_type:
-            raise ValueError('Request for ' + expected_type + ' parameter ' + name + ' but actual type is ' + pspec.type)
+    def __parameters(self):
+        snapshot = getattr(self, 'parameters', None)
+        if snapshot is None:
+            snapshot = ParameterSnapshot.load(self)
+        return snapshot
 
-        pval = ParameterVal.objects.get(wf_module=self, parameter_spec=pspec)
-        return pval.value
+    def get_param_raw(self, name, expected_type):
+        return self.__parameters().get_raw(name, expected_type)
 
     def get_param_string(self, name):
-        return self.get_param_raw(name, ParameterSpec.STRING)
+        return self.__parameters().get_string(name)
 
     def get_param_integer(self, name):
-        return int(self.get_param_raw(name, ParameterSpec.INTEGER))
+        return self.__parameters().get_integer(name)
 
     def get_param_float(self, name):
-        return float(self.get_param_raw(name, ParameterSpec.FLOAT))
+        return self.__parameters().get_float(name)
 
     def get_param_checkbox(self, name):
-        return self.get_param_raw(name, ParameterSpec.CHECKBOX) == 'True'
+        return self.__parameters().get_checkbox(name)
 
     def get_param_menu_idx(self, name):
-        try:
-            pspec = ParameterSpec.objects.get(module_version=self.module_version, id_name=name)
-        except ParameterSpec.DoesNotExist:
-            raise ValueError('Request for non-existent menu parameter ' + name)
-        pval = ParameterVal.objects.get(wf_module=self, parameter_spec=pspec)
-        return pval.selected_menu_item_idx()
+        return self.__parameters().get_menu_idx(name)
 
     def get_param_menu_string(self, name):
-        try:
-            pspec = ParameterSpec.objects.get(module_version=self.module_version, id_name=name)
-        except ParameterSpec.DoesNotExist:
-            raise ValueError('Request for non-existent menu parameter ' + name)
-        pval = ParameterVal.objects.get(wf_module=self, parameter_spec=pspec)
-        return pval.selected_menu_item_string()
+        return self.__parameters().get_menu_string(name)
 
     def get_param_column(self, name):
-        return self.get_param_raw(name, ParameterSpec.COLUMN)
+        return self.__parameters().get_column(name)
 
     def get_param_multicolumn(self, name):
-        return self.get_param_raw(name, ParameterSpec.MULTICOLUMN)
+        return self.__parameters().get_multicolumn(name)
 
     # --- Status ----
     # set error codes and status lights, notify client of changes
@@ -199,24 +222,24 @@ class WfModule(models.Model):
             ws_callbacks.ws_client_wf_module_status(self, self.status)
         self.save()
 
-    # re-render entire workflow when a module goes ready or error, on the assumption that new output data is available
+    # reload the module on clients when it goes ready or error, on the assumption that new output data is available
     def set_ready(self, notify=True):
         self.status = self.READY
         if notify:
-            ws_callbacks.ws_client_rerender_workflow(self.workflow)
+            ws_callbacks.ws_client_rerender_workflow(self.workflow, [self.id])
         self.save()
 
     def set_error(self, message, notify=True):
         self.error_msg = message
         self.status = self.ERROR
         if notify:
-            ws_callbacks.ws_client_rerender_workflow(self.workflow)
+            ws_callbacks.ws_client_rerender_workflow(self.workflow, [self.id])
         self.save()
 
     def set_is_collapsed(self, collapsed, notify=True):
         self.is_collapsed = collapsed
         if notify:
-            ws_callbacks.ws_client_rerender_workflow(self.workflow)
+            ws_callbacks.ws_client_rerender_workflow(self.workflow, [self.id])
         self.save()
 
     # --- Duplicate ---
@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models.signals import pre_save, post_save, post_init, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
-from server.models.WfModule import WfModule
+from server.models.Module import Module
+from server.models.ModuleVersion import ModuleVersion
+from server.models.WfModule import WfModule, ParameterVal
+import uuid
 
 # A Workflow is the user's "document," a series of Modules
 class Workflow(models.Model):
@@ -15,6 +20,12 @@ class Workflow(models.Model):
                                    default=None,
                                    on_delete=models.SET_DEFAULT)
 
+    # Changes every time the workflow or one of its modules or parameters is saved, including changes that don't
+    # make a new revision (module status, collapsing, update settings...). So (revision, status_epoch) identifies
+    # everything the workflow API returns, and responses can be cached under it.
+    # Random rather than a counter, so saving a stale Workflow object can never bring back an old value.
+    status_epoch = models.CharField('status_epoch', max_length=32, default='')
+
     def user_authorized_read(self, user):
         return user == self.owner or self.public == True
 
@@ -25,11 +36,12 @@ class Workflow(models.Model):
         return self.user_authorized_read(user) and not self.user_authorized_write(user)
 
     # use last delta ID as (non sequential) revision number, as later deltas will always have later ids
+    # (the id is on this row, so this doesn't load the delta)
     def revision(self):
-        if not self.last_delta:
+        if not self.last_delta_id:
             return 0
         else:
-            return self.last_delta.id
+            return self.last_delta_id
 
     # duplicate workflow, make it belong to specified user
     # No authorization checking here, that needs to be handled in the view
@@ -43,3 +55,56 @@ class Workflow(models.Model):
 
     def __str__(self):
         return self.name
+
+
+def new_status_epoch():
+    return uuid.uuid4().hex
+
+def bump_status_epoch(workflow_id):
+    if workflow_id is not None:
+        Workflow.objects.filter(pk=workflow_id).update(status_epoch=new_status_epoch())
+
+@receiver(pre_save, sender=Workflow, dispatch_uid='workflow_status_epoch')
+def workflow_status_epoch(sender, instance, **kwargs):
+    instance.status_epoch = new_status_epoch()
+
+# A WfModule leaving a workflow (DeleteModuleCommand, undoing AddModuleCommand) changes that workflow too, and by the
+# time it is saved its workflow_id is None. So remember which workflow it was loaded or last saved with.
+@receiver(post_init, sender=WfModule, dispatch_uid='wfmodule_saved_workflow')
+def wfmodule_saved_workflow(sender, instance, **kwargs):
+    instance._saved_workflow_id = instance.__dict__.get('workflow_id')  # without loading a deferred field
+
+@receiver(post_save, sender=WfModule, dispatch_uid='wfmodule_status_epoch')
+def wfmodule_status_epoch(sender, instance, **kwargs):
+    bump_status_epoch(instance.workflow_id)
+    if instance._saved_workflow_id != instance.workflow_id:
+        bump_status_epoch(instance._saved_workflow_id)
+    instance._saved_workflow_id = instance.workflow_id
+
+@receiver(post_delete, sender=WfModule, dispatch_uid='wfmodule_delete_status_epoch')
+def wfmodule_delete_status_epoch(sender, instance, **kwargs):
+    bump_status_epoch(instance.workflow_id)
+
+@receiver(post_save, sender=ParameterVal, dispatch_uid='parameterval_status_epoch')
+@receiver(post_delete, sender=ParameterVal, dispatch_uid='parameterval_delete_status_epoch')
+def parameterval_status_epoch(sender, instance, **kwargs):
+    if instance.wf_module_id is not None:
+        Workflow.objects.filter(wf_modules=instance.wf_module_id).update(status_epoch=new_status_epoch())
+
+# Module definitions are part of what the workflow API returns too (names, parameter specs...), so changing one, say
+# when a module is reloaded from GitHub, changes every workflow that uses it.
+# ParameterSpec is named, not imported: its module imports this one.
+@receiver(post_save, sender=ModuleVersion, dispatch_uid='moduleversion_status_epoch')
+def moduleversion_status_epoch(sender, instance, **kwargs):
+    Workflow.objects.filter(wf_modules__module_version=instance.id).update(status_epoch=new_status_epoch())
+
+@receiver(post_save, sender=Module, dispatch_uid='module_status_epoch')
+def module_status_epoch(sender, instance, **kwargs):
+    Workflow.objects.filter(wf_modules__module_version__module=instance.id).update(status_epoch=new_status_epoch())
+
+@receiver(post_save, sender='server.ParameterSpec', dispatch_uid='parameterspec_status_epoch')
+@receiver(post_delete, sender='server.ParameterSpec', dispatch_uid='parameterspec_delete_status_epoch')
+def parameterspec_status_epoch(sender, instance, **kwargs):
+    if instance.module_version_id is not None:
+        Workflow.objects.filter(wf_modules__module_version=instance.module_version_id) \
+            .update(status_epoch=new_status_epoch())
@@ -1,26 +1,29 @@
-import io
 import json
 import os
 from urllib.parse import urlsplit
-import requests
 
 import pandas as pd
 
 from django.core.exceptions import ValidationError
 from django.forms import URLField
 
-from .utils import save_data_if_changed
+from server import fetch
+from .utils import save_data_if_changed, save_data_unchanged, fetched_body_unchanged, save_fetch_validators
 
-def handle_dotcom_url(wf_module, url, split_url, num_rows):
+# Returned by the url handlers instead of a table when the response is the same as the one behind our stored data
+UNCHANGED = 'unchanged'
+
+def handle_dotcom_url(wf_module, url, split_url, num_rows, fetch_params=None):
     """
     Constructs the URL we'll use to query Enigma if the user passes in a URL to the publicly
     browsable page as opposed to enigma.io.
-    Returns the Pandas table if everything goes off smoothly. 
+    Returns (the Pandas table, the response) if everything goes off smoothly, or (UNCHANGED, response) if
+    the response is the same as the last one fetched with fetch_params. 
     Else, throws an error. 
     """
     if not "ENIGMA_COM_API_KEY" in os.environ:
         wf_module.set_error("No Enigma API Key set.")
-        return
+        return None, None
 
     api_key = os.environ["ENIGMA_COM_API_KEY"]
 
@@ -28,14 +31,21 @@ def handle_dotcom_url(wf_module, url, split_url, num_rows):
         dataset_id = split_url.path.split('/')[3]
     except Exception as e:
         wf_module.set_error("Unable to retrieve the dataset id from request.")
-        return
+        return None, None
 
     request_url = "https://public.enigma.com/api/datasets/{}?row_limit={}".format(dataset_id, num_rows)
     headers = {
         "authorization": "Bearer " + api_key
     }
-    response = requests.get(request_url, headers=headers)
+    try:
+        response = fetch.get(request_url, headers=headers)
+    except fetch.FetchError as e:
+        wf_module.set_error(str(e))
+        return None, None
     if response.status_code == 200:
+        if fetch_params is not None and fetched_body_unchanged(wf_module, fetch_params, response):
+            return UNCHANGED, response
+
         resultset = json.loads(response.text)
         # first retrieve the headers (i.e. the column names)
         column_headers = resultset["current_snapshot"]["table_rows"]["fields"]
@@ -45,24 +55,26 @@ def handle_dotcom_url(wf_module, url, split_url, num_rows):
 
         #...and finally create the Pandas object to return. 
         table = pd.DataFrame(data, columns=column_headers)
-        return table
+        return table, response
     else: 
         error = json.loads(response.text)
         if "message" in error:
             wf_module.set_error("Received error \"{}\" whilst retrieving data from {}".format(error["message"], url))
         else: # this should hopefully never get hit, but let's err on the side of caution.
             wf_module.set_error("Received error status {} whilst retrieving data from {}}".format(response.status_code, url))
+        return None, None
 
-def handle_dotio_url(wf_module, url, split_url, num_rows):
+def handle_dotio_url(wf_module, url, split_url, num_rows, fetch_params=None):
     """
     Processes response for any request to enigma.io. Here, we assume that the API key is provided, 
     because, at least at first glance (or two or three) there doesn't seem to be any provisions for 
     accessing dataset endpoints sans API key. 
+    Returns (table, response) or (UNCHANGED, response), like handle_dotcom_url.
     """
 
     if num_rows > 500:
         wf_module.set_error("You can request a maximum of 500 rows.")
-        return
+        return None, None
 
     if "/limit/" not in url:
         if url.endswith('/'):
@@ -70,7 +82,11 @@ def handle_dotio_url(wf_module, url, split_url, num_rows):
         else:
             url += "/limit/{}".format(num_rows)
 
-    response = requests.get(url)
+    try:
+        response = fetch.get(url)
+    except fetch.FetchError as e:
+        wf_module.set_error(str(e))
+        return None, None
     if response.status_code != 200:
         error = json.loads(response.text)
         if "message" in error:
@@ -81,14 +97,16 @@ def handle_dotio_url(wf_module, url, split_url, num_rows):
                message += ": " + error["info"]["additional"]["message"]
         wf_module.set_error("Unable to retrieve data from Enigma. Received {} status, with message {}"
             .format(response.status_code, message))
-        return
+        return None, None
+    if fetch_params is not None and fetched_body_unchanged(wf_module, fetch_params, response):
+        return UNCHANGED, response
     try:
         json_text = json.loads(response.text)
         table = pd.read_json(json.dumps(json_text['result']))
-        return table
+        return table, response
     except Exception as ex: # Generic exceptions suck, but is it the most pragmatic/all-encompassing here? 
         wf_module.set_error("Unable to process request: {}".format(str(ex)))
-        return
+        return None, None
 
 class EnigmaDataLoader:
     @staticmethod
@@ -137,24 +155,28 @@ class EnigmaDataLoader:
             return None # there's no point going any further for obvious reasons
 
         # Can wrap this around a single try because only one or the other will be called. 
+        fetch_params = [url, num_rows]
         try: 
             if netloc.endswith("io"):
-                data = handle_dotio_url(wf_module, url, split_url, num_rows)
+                data, response = handle_dotio_url(wf_module, url, split_url, num_rows, fetch_params)
                     
             else:
                 # this has to be ".com" as we've already done the check above for dodgy URLs. 
                 # this returns the Pandas table. 
-                data = handle_dotcom_url(wf_module, url, split_url, num_rows)
+                data, response = handle_dotcom_url(wf_module, url, split_url, num_rows, fetch_params)
         except Exception as ex:
             wf_module.set_error("Caught error whilst attempting to retrieve details from Enigma: {}".format(str(ex)))
 
         # If we have got this far, and not run into any issues, we should do some data versioning magic. 
         if wf_module.status != wf_module.ERROR:
             wf_module.set_ready(notify=False)
-            csv_data = data.to_csv(index=False)
             updated = wf_module.auto_update_data or event.get('type') == 'click'
 
-            save_data_if_changed(wf_module, csv_data, auto_change_version=updated)
+            if data is UNCHANGED:
+                save_data_unchanged(wf_module)
+            else:
+                save_data_if_changed(wf_module, data, auto_change_version=updated)
+            save_fetch_validators(wf_module, fetch_params, response)
 
     @staticmethod
     def render(wf_module, table):
@@ -162,8 +184,4 @@ class EnigmaDataLoader:
         Propagates the table to the front-end. 
         Here, event() does all the heavy lifting. 
         """
-        retrieved_data = wf_module.retrieve_data()
-        if retrieved_data != None and len(retrieved_data):
-            return pd.read_csv(io.StringIO(retrieved_data))
-        else:
-            return None
\ No newline at end of file
+        return wf_module.retrieve_table()
\ No newline at end of file
@@ -1,9 +1,74 @@
 from .moduleimpl import ModuleImpl
 from .utils import *
+from functools import lru_cache
+import ast
 import pandas as pd
 
 # ---- Formula ----
 
+# Syntax that means the same thing applied to whole columns (pandas Series) as applied to single values.
+# Formulas built only from these, plus column names and numbers, are evaluated once on whole columns.
+VECTORIZABLE_NODES = (ast.Expression, ast.Load,
+                      ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+                      ast.UnaryOp, ast.UAdd, ast.USub,
+                      ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+# Names used by the formula if it is built only from vectorizable syntax, else None. Cached like compiled code.
+@lru_cache(maxsize=USER_CODE_CACHE_SIZE)
+def vectorizable_names(formula):
+    try:
+        tree = ast.parse(formula, mode='eval')
+    except SyntaxError:
+        return None
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.Num):
+            pass
+        elif isinstance(node, ast.Compare):
+            if len(node.ops) != 1:
+                return None     # a < b < c is a < b and b < c, and 'and' doesn't work on Series
+        elif not isinstance(node, VECTORIZABLE_NODES):
+            return None
+    return frozenset(names)
+
+def is_vectorizable(formula, colnames):
+    names = vectorizable_names(formula)
+    return names is not None and all(n in colnames for n in names)
+
+# Evaluate the formula once, with each column name bound to the whole column.
+# Returns a float column like the row-by-row loop produces, or None if the result isn't numeric, or if it may not be
+# what the loop would give: numpy turns x/0 into inf or NaN where Python raises ZeroDivisionError, and int64
+# arithmetic wraps around on overflow. So integer columns are evaluated as floats, where overflow is inf, and any inf
+# or NaN in a row whose inputs were all finite means we leave that formula to the loop.
+def eval_vectorized(code, table, names):
+    columns = {}
+    inputs_finite = np.ones(len(table), dtype=bool)
+    for name in names:
+        column = table[name]
+        if np.issubdtype(column.dtype, np.integer):
+            column = column.astype(np.float64)
+        if np.issubdtype(column.dtype, np.number):
+            inputs_finite &= np.isfinite(column.values)
+        columns[name] = column
+
+    result = eval(code, custom_code_globals, columns)
+
+    if isinstance(result, pd.Series):
+        if len(result) != len(table) or not (np.issubdtype(result.dtype, np.number) or result.dtype == bool):
+            return None
+        values = result.values.astype(np.float64)
+    elif isinstance(result, (int, float, np.number)):
+        values = np.full(len(table), result, dtype=np.float64)  # constant formula
+    else:
+        return None
+
+    if np.any(~np.isfinite(values) & inputs_finite):
+        return None
+    return pd.Series(values)
+
 class Formula(ModuleImpl):
     def render(wf_module, table):
 
@@ -15,16 +80,28 @@ class Formula(ModuleImpl):
             return table    # nop if no formula
 
         colnames = list(table.columns)
-        newcol = pd.Series(np.zeros(len(table)))
+        newcol = None
 
         # Catch errors with the formula and display to user
         try:
-            code = compile(formula, '<string>', 'eval')
+            code = compile_user_code(formula, 'eval')
+
+            # Arithmetic and comparisons on columns run as whole-column numpy operations. If that fails for any
+            # reason, or gives results the loop might not (see eval_vectorized), we fall back to the loop, which
+            # reports errors.
+            if is_vectorizable(formula, colnames):
+                try:
+                    newcol = eval_vectorized(code, table, vectorizable_names(formula))
+                except Exception:
+                    newcol = None
+
+            if newcol is None:
+                newcol = pd.Series(np.zeros(len(table)))
 
-            # Much experimentation went into the form of this loop for good performance.
-            # Note we don't use iterrows or any pandas indexing, and construct the values dict ourselves
-            for i,row in enumerate(table.values):
-                newcol[i] = eval(code, custom_code_globals, dict(zip(colnames, row)))
+                # Much experimentation went into the form of this loop for good performance.
+                # Note we don't use iterrows or any pandas indexing, and construct the values dict ourselves
+                for i,row in enumerate(table.values):
+                    newcol[i] = eval(code, custom_code_globals, dict(zip(colnames, row)))
         except Exception as e:
             wf_module.set_error(str(e))
             return None
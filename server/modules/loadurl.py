@@ -4,43 +4,143 @@ import csv
 import pandas as pd
 from pandas.parser import CParserError
 from xlrd import XLRDError
+from decimal import Decimal
 import io
 import json
 import requests
 import re
+try:
+    import ijson.backends.yajl2_c as ijson      # much faster, if yajl is installed
+except ImportError:
+    import ijson
+from ijson.common import JSONError, ObjectBuilder
+from server import fetch
+from server.csvreader import read_csv
 from .utils import *
 
 # ---- LoadURL ----
 
-# Walks down through a dict through keys and arrays
-# e.g. "Results.series[0].data" -> jsondict['Results']['Series'][0]['data']
-def parse_json_path(d, path):
+# Splits a json path into keys and array indices
+# e.g. "Results.series[0].data" -> ['Results', 'series', 0, 'data']
+def json_path_steps(path):
     if path == '':
-        return d
+        return []
 
     pattern = re.compile('([^\[]+)\[([0-9]+)\]$') # 'key[8]' -> 'key','8'
 
-    # walk down keys and arrays
+    steps = []
     for p in path.split('.'):
         m = pattern.match(p)
         if m:
-            d = d[m.group(1)]           # d['key']
-            d = d[int(m.group(2))]      # d[8]
+            steps += [m.group(1), int(m.group(2))]
         else:
-            d = d[p]
+            steps.append(p)
+    return steps
+
+
+# ---- Streaming JSON ----
+# JSON API dumps can be hundreds of MB. Parsed whole, into Python objects and then a DataFrame, they'd take several
+# times that in memory. So we parse the body as a stream of events, skip to the json path without building anything
+# we pass on the way, and build the table from the array there a batch of rows at a time.
+
+# Rows per DataFrame built while reading an array of rows
+JSON_BATCH_ROWS = 10000
+
+START_EVENTS = ('start_map', 'start_array')
+END_EVENTS = ('end_map', 'end_array')
+
+# (event, value) pairs from parsing file, with non-integer numbers as floats like json.loads gives (ijson gives Decimals)
+def json_events(file):
+    try:
+        for event, value in ijson.basic_parse(file):
+            if event == 'number' and isinstance(value, Decimal):
+                value = float(value)
+            yield event, value
+    except JSONError as e:
+        raise ValueError('Invalid JSON: %s' % str(e))
+
+# Read the rest of the value whose first event was (event, value). Returns it, or None if build=False.
+def read_json_value(events, event, value, build=True):
+    builder = ObjectBuilder() if build else None
+    depth = 0
+    while True:
+        if builder:
+            builder.event(event, value)
+        if event in START_EVENTS:
+            depth += 1
+        elif event in END_EVENTS:
+            depth -= 1
+        if depth == 0:
+            return builder.value if builder else None
+        event, value = next(events)
+
+# Walk events down to the value at the json path. Returns its first (event, value); raises KeyError if it isn't there
+def find_json_path(events, path):
+    event, value = next(events)
+    for step in json_path_steps(path):
+        if isinstance(step, int):
+            if event != 'start_array':
+                raise KeyError(step)
+            event, value = next(events)
+            for i in range(step):
+                if event == 'end_array':
+                    raise KeyError(step)
+                read_json_value(events, event, value, build=False)
+                event, value = next(events)
+            if event == 'end_array':
+                raise KeyError(step)
+        else:
+            if event != 'start_map':
+                raise KeyError(step)
+            while True:
+                event, key = next(events)
+                if event == 'end_map':
+                    raise KeyError(step)
+                event, value = next(events)
+                if key == step:
+                    break
+                read_json_value(events, event, value, build=False)
+    return event, value
+
+# Read to the end of the JSON, so a body that is truncated or has data after it is an error, like it is for json.load
+def read_json_end(events):
+    for event, value in events:
+        pass
+
+# Table from the JSON in file, at the json path, like pd.DataFrame() of that value in json.load(file)
+# Raises KeyError if the path isn't in the JSON, ValueError if it isn't JSON or can't be made a table.
+def json_to_table(file, path):
+    events = json_events(file)
+    event, value = find_json_path(events, path)
+    if event != 'start_array':
+        table = pd.DataFrame(read_json_value(events, event, value))  # not rows, so not built row by row
+        read_json_end(events)
+        return table
+
+    batches = []
+    rows = []
+    event, value = next(events)
+    while event != 'end_array':
+        rows.append(read_json_value(events, event, value))
+        if len(rows) == JSON_BATCH_ROWS:
+            batches.append(pd.DataFrame(rows))
+            rows = []
+        event, value = next(events)
+    read_json_end(events)
+
+    if rows or not batches:
+        batches.append(pd.DataFrame(rows))
+    if len(batches) == 1:
+        return batches[0]
+    return pd.concat(batches, ignore_index=True)
 
-    return d
 
 class LoadURL(ModuleImpl):
 
     # Input table ignored.
     @staticmethod
     def render(wf_module, table):
-        tablestr = wf_module.retrieve_data()
-        if (tablestr != None) and (len(tablestr)>0):
-            return pd.read_csv(io.StringIO(tablestr))
-        else:
-            return None
+        return wf_module.retrieve_table()
 
     # Load a CSV from file when fetch pressed
     @staticmethod
@@ -51,19 +151,47 @@ class LoadURL(ModuleImpl):
         wfm.set_busy()
         url = wfm.get_param_string('url')
 
+        # if the server says it hasn't changed since we last fetched it, there's nothing to parse or store
+        fetch_params = [url, wfm.get_param_string('json_path')]
         mimetypes = 'application/json, text/csv, application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        res = requests.get(url, headers = {'accept': mimetypes})
+        headers = {'accept': mimetypes}
+        headers.update(conditional_request_headers(get_fetch_validators(wfm, fetch_params)))
+        # JSON goes to a temporary file, to be parsed from there a bit at a time; anything else is read into memory
+        body = None
+        content_hash = None
+        try:
+            with fetch.open_url(url, headers = headers) as res:
+                # get content type, ignoring charset for now
+                content_type = res.headers.get('content-type', '').split(';')[0]
+                if res.status_code == requests.codes.ok and content_type == 'application/json':
+                    body, content_hash = fetch.spool_body(res, url)
+                else:
+                    fetch.read_body(res, url)
+        except fetch.FetchError as e:
+            wfm.set_error(str(e))
+            return
+
+        if res.status_code == requests.codes.not_modified:
+            wfm.set_ready(notify=False)
+            save_data_unchanged(wfm)
+            return
 
         if res.status_code != requests.codes.ok:
             wfm.set_error('Error %s fetching url' % str(res.status_code))
             return
 
-        # get content type, ignoring charset for now
-        content_type = res.headers.get('content-type').split(';')[0]
+        # same bytes as last time, so the same table
+        if fetched_body_unchanged(wfm, fetch_params, res, content_hash):
+            if body is not None:
+                body.close()
+            wfm.set_ready(notify=False)
+            save_data_unchanged(wfm)
+            save_fetch_validators(wfm, fetch_params, res, content_hash)  # the server may have new validators
+            return
 
         if content_type == 'text/csv':
             try:
-                table = pd.read_csv(io.StringIO(res.text))
+                table = read_csv(res.text)
             except CParserError as e:
                 wfm.set_error(str(e))
                 table = pd.DataFrame([{'result':res.text}])
@@ -76,21 +204,17 @@ class LoadURL(ModuleImpl):
                 return
 
         elif content_type == 'application/json':
+            path = wfm.get_param_string('json_path')
             try:
-                table_json = res.json()
-                path = wfm.get_param_string('json_path')
-                if len(path)>0:
-                    table_json = parse_json_path(table_json, path)
-                table = pd.DataFrame(table_json)
+                with body:
+                    table = json_to_table(body, path)
 
             except KeyError as e:
                 wfm.set_error('Bad json path %s' % path)
-                table = pd.DataFrame([{'result':res.text}])
                 return
 
             except ValueError as e:
                 wfm.set_error(str(e))
-                table = pd.DataFrame([{'result': res.text}])
                 return
 
         elif content_type == "application/octet-stream" and '.xls' in url:
@@ -107,13 +231,13 @@ class LoadURL(ModuleImpl):
         if wfm.status != wfm.ERROR:
 
             wfm.set_ready(notify=False)
-            new_csv = table.to_csv(index=False)  # index=False to prevent pandas from adding an index col
 
             # Change the data version (when new data found) only if this module set to auto update, or user triggered
             auto = wfm.auto_update_data or (e is not None and e.get('type') == "click")
 
             # Also notifies client
-            save_data_if_changed(wfm, new_csv, auto_change_version=auto)
+            save_data_if_changed(wfm, table, auto_change_version=auto)
+            save_fetch_validators(wfm, fetch_params, res, content_hash)
 
 
 
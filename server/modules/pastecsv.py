@@ -1,7 +1,7 @@
 from .moduleimpl import ModuleImpl
 import pandas as pd
 from pandas.parser import CParserError
-import io
+from server.csvreader import read_csv
 
 
 # ---- PasteCSV ----
@@ -22,8 +22,7 @@ class PasteCSV(ModuleImpl):
             wf_module.set_error('Please enter a CSV')
             return None
         try:
-            table = pd.read_csv(io.StringIO(tablestr), header=header_row,
-                                skipinitialspace=True)
+            table = read_csv(tablestr, header=header_row, skipinitialspace=True)
         except CParserError as e:
             wf_module.set_error(str(e))
             return None
@@ -1,6 +1,6 @@
 from .moduleimpl import ModuleImpl
-from .utils import *
-import pandas as pd
+from server.sandbox import sandbox_pool, SandboxError
+from django.conf import settings
 
 # ---- PythonCode ----
 
@@ -15,21 +15,12 @@ class PythonCode(ModuleImpl):
         # turn the user-supplied text into a function declaration
         code = 'def process(table):\n' + indent_lines(code)
 
-        # this is where we will store the function we define
-        locals = {}
-
-        # Catch errors with the code and display to user
+        # Run in a sandbox process, so runaway code can't hurt the server. Errors in the code, and exceeded limits,
+        # are shown to the user
         try:
-            exec(code, custom_code_globals, locals )
-
-        except Exception as e:
+            return sandbox_pool().run(code, table,
+                                      timeout=settings.PYTHONCODE_TIMEOUT,
+                                      cpu_seconds=settings.PYTHONCODE_CPU_SECONDS)
+        except SandboxError as e:
             wf_module.set_error(str(e))
             return None
-
-        if not 'process' in locals:
-            wf_module.set_error('Problem defining function')
-            return None
-
-        out_table = locals['process'](table)
-        return out_table
-
@@ -6,8 +6,9 @@ import os
 import requests
 import csv
 import io
+import itertools
 from .moduleimpl import ModuleImpl
-from server.models import ChangeDataVersionCommand
+from server.models import ChangeDataVersionCommand, StoredObject
 from .utils import *
 
 # ---- Twitter ----
@@ -21,15 +22,15 @@ class Twitter(ModuleImpl):
     # Get dataframe of last tweets fron our storage,
     @staticmethod
     def get_stored_tweets(wf_module):
-        tablestr = wf_module.retrieve_data()
-        if (tablestr != None) and (len(tablestr) > 0):
-            return pd.read_csv(io.StringIO(tablestr))
-        else:
-            return None
+        return wf_module.retrieve_table()
+
+    # Most tweets to page back through in one accumulating fetch. The user timeline API stops at 3200 anyway.
+    MAX_TWEETS_PER_FETCH = 3200
 
     # Get from Twitter, return as dataframe
+    # Gets tweets newer than since_id (if set), up to max_tweets of them. Without max_tweets, just one page of them.
     @staticmethod
-    def get_new_tweets(wfm, querytype, query, old_tweets):
+    def get_new_tweets(wfm, querytype, query, since_id=None, max_tweets=None):
 
         # Authenticate with "app authentication" mode (high rate limit, read only)
         consumer_key = os.environ['CJW_TWITTER_CONSUMER_KEY']
@@ -37,11 +38,16 @@ class Twitter(ModuleImpl):
         auth = tweepy.AppAuthHandler(consumer_key, consumer_secret)
         api = tweepy.API(auth)
 
-        # Only get last 100 tweets, because that is twitter API max for single call
+        # Pages of 200 and 100 tweets, because those are the twitter API max for single calls
         if querytype == Twitter.QUERY_TYPE_USER:
-            tweetsgen = api.user_timeline(query, count=200)
+            cursor = tweepy.Cursor(api.user_timeline, id=query, count=200, since_id=since_id)
+        else:
+            cursor = tweepy.Cursor(api.search, q=query, count=100, since_id=since_id)
+
+        if max_tweets is None:
+            tweetsgen = itertools.chain.from_iterable(cursor.pages(1))
         else:
-            tweetsgen = api.search(q=query, count=100)
+            tweetsgen = cursor.items(max_tweets)
 
         # Columns to retrieve and store from Twitter
         # Also, we use this to figure ou the index the id field when merging old and new tweets
@@ -54,12 +60,46 @@ class Twitter(ModuleImpl):
 
 
     # Combine this set of tweets with previous set of tweets
+    # Reads and rewrites every stored tweet, so only for when we don't know which tweets are stored (see append_tweets)
+    @staticmethod
     def merge_tweets(wf_module, new_table):
         old_table = Twitter.get_stored_tweets(wf_module)
         if old_table is not None:
             new_table = pd.concat([new_table,old_table]).drop_duplicates(['id']).sort_values('id',ascending=False).reset_index(drop=True)
         return new_table
 
+    # Store tweets fetched since since_id (or since whenever, if None) in accumulate mode.
+    # Stored tweets are sorted newest first, and fetched with since_id set to the newest one, so new tweets just go on
+    # the front of the stored table: StoredObject.append_table only writes the new ones.
+    @staticmethod
+    def append_tweets(wfm, fetch_params, since_id, tweets, auto_change_version):
+        stored = wfm.retrieve_stored_object()
+
+        if since_id is None and stored is not None:
+            # stored before we kept track of since_id, or for another query: no telling how old tweets compare
+            tweets = Twitter.merge_tweets(wfm, tweets)
+            save_data_if_changed(wfm, tweets, auto_change_version=auto_change_version)
+        else:
+            if since_id is not None:
+                tweets = tweets[tweets['id'] > since_id]
+            if len(tweets) == 0:
+                save_data_unchanged(wfm)
+                return
+
+            tweets = tweets.sort_values('id', ascending=False).reset_index(drop=True)
+            version = StoredObject.append_table(wfm, stored, tweets).stored_at
+            wfm.last_update_check = timezone.now()
+            wfm.save()
+            if auto_change_version:
+                ChangeDataVersionCommand.create(wfm, version)  # also notifies client
+            else:
+                notify_client_workflow_version_changed(wfm.workflow)
+
+        # Only once the new tweets are the current data do we fetch from after them. Until then, the next fetch
+        # starts from the current data again.
+        if auto_change_version and len(tweets) > 0:
+            update_fetch_validators(wfm, params=fetch_params, since_id=int(tweets['id'].max()))
+
     # Render just returns previously retrieved tweets
     @staticmethod
     def render(wf_module, table):
@@ -78,12 +118,13 @@ class Twitter(ModuleImpl):
             querytype = wfm.get_param_menu_idx("querytype")
             query = wfm.get_param_string('query')
 
-            if wfm.get_param_checkbox('accumulate'):
-                old_tweets = Twitter.get_stored_tweets(wfm)
-                tweets = Twitter.get_new_tweets(wfm, querytype, query, old_tweets)
-                tweets = Twitter.merge_tweets(wfm, tweets)
+            accumulate = wfm.get_param_checkbox('accumulate')
+            if accumulate:
+                fetch_params = [querytype, query]
+                since_id = get_fetch_validators(wfm, fetch_params).get('since_id')
+                tweets = Twitter.get_new_tweets(wfm, querytype, query, since_id, Twitter.MAX_TWEETS_PER_FETCH)
             else:
-                tweets = Twitter.get_new_tweets(wfm, querytype, query, None)
+                tweets = Twitter.get_new_tweets(wfm, querytype, query)
 
         except TweepError as e:
             if querytype==Twitter.QUERY_TYPE_USER and e.response.status_code==401:
@@ -104,13 +145,15 @@ class Twitter(ModuleImpl):
         if wfm.status != wfm.ERROR:
 
             wfm.set_ready(notify=False)
-            new_csv = tweets.to_csv(index=False)  # index=False to prevent pandas from adding an index col
 
             # Change the data version (when new data found) only if this module set to auto update, or user triggered
             auto = wfm.auto_update_data or (e is not None and e.get('type') == "click")
 
             # Also notifies client
-            save_data_if_changed(wfm, new_csv, auto_change_version=auto)
+            if accumulate:
+                Twitter.append_tweets(wfm, fetch_params, since_id, tweets, auto)
+            else:
+                save_data_if_changed(wfm, tweets, auto_change_version=auto)
 
 
 
@@ -1,25 +1,43 @@
 from .moduleimpl import ModuleImpl
 from .utils import *
+from server.csvreader import read_csv
+from xlrd import XLRDError
 
 class UploadFile(ModuleImpl):
 
+    # Read an uploaded file (anything with a name and read(), e.g. an UploadedFile) into a table.
+    # Raises ValueError, with a message for the user, if we can't.
+    @staticmethod
+    def parse_file(name, file):
+        name = name.lower()
+        try:
+            if name.endswith('.xls') or name.endswith('.xlsx'):
+                return pd.read_excel(file)
+            elif name.endswith('.csv'):
+                return read_csv(file)
+        except XLRDError as e:
+            raise ValueError(str(e))
+        raise ValueError('Unknown file type.')
+
     # Input table ignored.
+    # Status changes don't notify clients here: render runs in a background worker, which notifies clients once the
+    # whole workflow has rendered.
     @staticmethod
     def render(wf_module, table):
-        wf_module.set_busy(notify=True)
-        file = wf_module.retrieve_file()
-        if file != None:
-            if file.name.endswith('.xls') or file.name.endswith('.xlsx') or file.name.endswith('.XLS') or file.name.endswith('.XLSX'):
-                table_aux = pd.read_excel(file)
-                wf_module.set_ready(notify=True)
-                return table_aux
-            elif file.name.endswith('.csv') or file.name.endswith('.CSV'):
-                table_aux = pd.read_csv(file)
-                wf_module.set_ready(notify=True)
-                return table_aux
-            else:
-                wf_module.set_error('Unknown file type.')
-                return None
+        stored_object = wf_module.retrieve_stored_object()
+        if stored_object is None:
+            return None
+
+        # Uploads are parsed once, when uploaded (see StoredObjectView), and stored as tables
+        if stored_object.hash is not None:
+            table = stored_object.get_table()
         else:
-            wf_module.set_ready(notify=True)
-            return None
\ No newline at end of file
+            # Uploaded before that, so we still have the file as uploaded
+            try:
+                table = UploadFile.parse_file(stored_object.file.name, stored_object.file)
+            except ValueError as e:
+                wf_module.set_error(str(e), notify=False)
+                return None
+
+        wf_module.set_ready(notify=False)
+        return table
@@ -1,32 +1,114 @@
-from server.models import ChangeDataVersionCommand
+from server.models import ChangeDataVersionCommand, StoredObject
 from server.versions import notify_client_workflow_version_changed
+from server.usercode import custom_code_globals, compile_user_code, define_user_function, USER_CODE_CACHE_SIZE
 from django.utils import timezone
-import math
+import hashlib
+import json
 import pandas as pd
 import numpy as np
+try:
+    from pandas.util import hash_pandas_object
+except ImportError:
+    from pandas.tools.hashing import hash_pandas_object     # pandas < 0.20
 
-# Utility class: globals defined for user-entered python code
-custom_code_globals = {
-    '__builtins__': {},  # disallow import etc. (though still not impossible!)
-    'str': str,
-    'math' : math,
-    'pd' : pd,
-    'np' : np
-}
-
-# Store retrieved data (in text form here, as csv) if it isn't different from currently stored data
+# Store retrieved data (a table) if it is different from currently stored data
 # If it is and auto_change_verssion, switch to new data using a ChangeDataVersion command
 def save_data_if_changed(wfm, new_data, auto_change_version=True):
 
     wfm.last_update_check = timezone.now()
     wfm.save()
 
+    # Hashing rows is much cheaper than serializing the table, so first check that against the last table we stored
+    new_table_hash = table_hash(new_data)
+    if new_table_hash is not None and new_table_hash == current_fetch_validators(wfm).get('table_hash'):
+        notify_client_workflow_version_changed(wfm.workflow)
+        return
+
     # Check if currently saved data is any different. If so create a new data version and maybe switch to it
-    old_data = wfm.retrieve_data()
-    if new_data != old_data:
-        version = wfm.store_data(new_data)
+    # Stored data is content-addressed, so this is a hash comparison; we never need to load the old data.
+    type, payload = StoredObject.table_to_payload(new_data)
+    if StoredObject.payload_hash(payload) != wfm.retrieve_data_hash():
+        version = StoredObject.create_from_payload(wfm, type, payload).stored_at
         if auto_change_version:
             ChangeDataVersionCommand.create(wfm, version)  # also notifies client
     else:
         # no new data version, but we still want client to update WfModule status and last update check time
         notify_client_workflow_version_changed(wfm.workflow)
+
+    update_fetch_validators(wfm, table_hash=new_table_hash)
+
+# We know without looking that the data is the same as last time (e.g. the server said 304 Not Modified)
+def save_data_unchanged(wfm):
+    wfm.last_update_check = timezone.now()
+    wfm.save()
+    notify_client_workflow_version_changed(wfm.workflow)
+
+# Hash of a table's columns, dtypes and every row, or None for tables pandas can't hash (e.g. lists in cells)
+def table_hash(table):
+    try:
+        row_hashes = hash_pandas_object(table, index=True).values
+    except (TypeError, ValueError):
+        return None
+    h = hashlib.sha256()
+    h.update(json.dumps([[str(c), str(t)] for c, t in zip(table.columns, table.dtypes)]).encode('utf-8'))
+    h.update(row_hashes.tobytes())
+    return h.hexdigest()
+
+def body_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+# ---- Fetch validators ----
+# What we know about the fetch behind a module's stored data, so later fetches can skip work when nothing changed.
+# Kept as JSON in WfModule.fetch_validators:
+#   params              parameters that turned the response into a table (url, json path...)
+#   etag, last_modified HTTP validators of the response, for conditional requests
+#   body_hash           hash of the raw response body, so the same body needn't be parsed again
+#   table_hash          row hash of the parsed table, so the same table needn't be serialized again
+#   data_hash           hash of the stored data all that describes. Once that isn't the current data, we ignore it all.
+
+def current_fetch_validators(wfm):
+    if not wfm.fetch_validators:
+        return {}
+    try:
+        validators = json.loads(wfm.fetch_validators)
+    except ValueError:
+        return {}
+    if validators.get('data_hash') is None or validators['data_hash'] != wfm.retrieve_data_hash():
+        return {}
+    return validators
+
+# Validators for a fetch with these params, or {}
+def get_fetch_validators(wfm, params):
+    validators = current_fetch_validators(wfm)
+    if validators.get('params') != params:
+        return {}
+    return validators
+
+def update_fetch_validators(wfm, **fields):
+    validators = current_fetch_validators(wfm)
+    validators.update(fields)
+    validators['data_hash'] = wfm.retrieve_data_hash()
+    wfm.fetch_validators = json.dumps(validators)
+    wfm.save()
+
+def conditional_request_headers(validators):
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+# Call after storing the data parsed from response.
+# content_hash is the body_hash() of the body, for bodies that weren't read into response.content (see fetch.spool_body)
+def save_fetch_validators(wfm, params, response, content_hash=None):
+    update_fetch_validators(wfm,
+                            params=params,
+                            etag=response.headers.get('etag'),
+                            last_modified=response.headers.get('last-modified'),
+                            body_hash=content_hash or body_hash(response.content))
+
+# True if the response body is the same as the one behind the stored data. Then there's no need to parse it.
+def fetched_body_unchanged(wfm, params, response, content_hash=None):
+    return get_fetch_validators(wfm, params).get('body_hash') == (content_hash or body_hash(response.content))
@@ -0,0 +1,218 @@
+# Caches of rendered WfModule output tables, keyed by a fingerprint of the module's inputs (see execute.py)
+# Two tiers: a per-process in-memory LRU, backed by Arrow files on disk that are shared by all workers and survive
+# restarts. Both tiers treat a fingerprint as immutable, so entries never need invalidation, only eviction.
+
+from django.conf import settings
+from collections import OrderedDict
+import os
+import threading
+import uuid
+import pyarrow as pa
+
+
+class MemoryRenderCache:
+    MISS = object()     # sentinel, as None is a legitimate cached render result
+
+    def __init__(self, max_entries=100):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()        # fingerprint -> table, least recently used first
+        self.lock = threading.Lock()
+
+    # Returns a copy of the cached table (modules are allowed to modify their input in place), or MISS
+    def get(self, fingerprint):
+        with self.lock:
+            if fingerprint not in self.entries:
+                return MemoryRenderCache.MISS
+            self.entries.move_to_end(fingerprint)
+            table = self.entries[fingerprint]
+        return table.copy() if table is not None else None
+
+    # Returns (rows startrow:endrow, total rows) without copying the rest of the table, or MISS
+    # endrow may be None, meaning to the end of the table
+    def get_window(self, fingerprint, startrow, endrow):
+        with self.lock:
+            if fingerprint not in self.entries:
+                return MemoryRenderCache.MISS
+            self.entries.move_to_end(fingerprint)
+            table = self.entries[fingerprint]
+        if table is None:
+            return (None, 0)
+        return (table.iloc[startrow:endrow].copy(), len(table))
+
+    def put(self, fingerprint, table):
+        if table is not None:
+            table = table.copy()
+        with self.lock:
+            self.entries[fingerprint] = table
+            self.entries.move_to_end(fingerprint)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# One Arrow IPC file per fingerprint, memory-mapped on load. Least recently used files are deleted once the
+# directory grows past max_bytes; file mtime is the LRU clock, so every process sees the same order.
+# Tables are written in record batches of batch_rows, so a window of rows can be read without touching the rest.
+class DiskRenderCache:
+    def __init__(self, directory, max_bytes, batch_rows=10000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.batch_rows = batch_rows
+
+    def path_for(self, fingerprint):
+        return os.path.join(self.directory, fingerprint + '.arrow')
+
+    # Returns table or None if not cached
+    def get(self, fingerprint):
+        path = self.path_for(fingerprint)
+        try:
+            source = pa.memory_map(path, 'r')
+            try:
+                table = pa.RecordBatchFileReader(source).read_all().to_pandas()
+            finally:
+                source.close()
+            os.utime(path)
+        except (OSError, pa.ArrowException):
+            return None     # not cached, or evicted out from under us
+        return table
+
+    # Returns (rows startrow:endrow, total rows) or None if not cached. Only the record batches that overlap the
+    # window are converted to pandas; the row count comes from batch metadata. endrow may be None.
+    def get_window(self, fingerprint, startrow, endrow):
+        path = self.path_for(fingerprint)
+        try:
+            source = pa.memory_map(path, 'r')
+            try:
+                reader = pa.RecordBatchFileReader(source)
+                batches = [reader.get_batch(i) for i in range(reader.num_record_batches)]   # zero-copy from the map
+                total_rows = sum(b.num_rows for b in batches)
+                if endrow is None or endrow > total_rows:
+                    endrow = total_rows
+
+                # keep the overlapping batches, and the offset of the window into the first of them
+                offset = 0
+                window_batches = []
+                batch_start = 0
+                for b in batches:
+                    batch_end = batch_start + b.num_rows
+                    if batch_end > startrow and batch_start < endrow:
+                        if not window_batches:
+                            offset = startrow - batch_start
+                        window_batches.append(b)
+                    batch_start = batch_end
+
+                if window_batches:
+                    table = pa.Table.from_batches(window_batches).to_pandas()
+                    table = table.iloc[offset:offset + (endrow - startrow)]
+                elif batches:
+                    table = pa.Table.from_batches(batches[:1]).to_pandas().iloc[0:0]  # empty window, keep columns
+                else:
+                    table = reader.read_all().to_pandas()
+            finally:
+                source.close()
+            os.utime(path)
+        except (OSError, pa.ArrowException):
+            return None
+        return (table, total_rows)
+
+    def put(self, fingerprint, table):
+        # Arrow column names must be strings; tables without header rows have int column names, keep those in memory
+        if table is None or not all(isinstance(c, str) for c in table.columns):
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(fingerprint)
+        temp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+        try:
+            arrow_table = pa.Table.from_pandas(table)
+            with open(temp_path, 'wb') as f:
+                writer = pa.RecordBatchFileWriter(f, arrow_table.schema)
+                writer.write_table(arrow_table, chunksize=self.batch_rows)
+                writer.close()
+            os.replace(temp_path, path)     # atomic, so readers in other processes never see a partial file
+        except Exception:
+            # Not every table converts to Arrow (e.g. object columns of mixed types); those stay memory-only
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        self.evict()
+
+    # Delete least recently used files until we are under max_bytes
+    def evict(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.arrow')]
+        except OSError:
+            return
+
+        files = []
+        for e in entries:
+            try:
+                stat = e.stat()
+            except OSError:
+                continue    # deleted by another process
+            files.append((stat.st_mtime, stat.st_size, e.path))
+
+        total = sum(f[1] for f in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for e in os.scandir(self.directory):
+            if e.name.endswith('.arrow'):
+                os.remove(e.path)
+
+
+# Memory first, then disk. Disk hits are promoted to memory.
+class RenderCache:
+    MISS = MemoryRenderCache.MISS
+
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, fingerprint):
+        table = self.memory.get(fingerprint)
+        if table is not RenderCache.MISS:
+            return table
+
+        table = self.disk.get(fingerprint)
+        if table is None:
+            return RenderCache.MISS
+        self.memory.put(fingerprint, table)
+        return table
+
+    # Like get(), but only materializes rows startrow:endrow. Returns (window, total rows) or MISS.
+    # Windows read from disk are not promoted to memory, as that would mean loading the whole table.
+    def get_window(self, fingerprint, startrow, endrow):
+        result = self.memory.get_window(fingerprint, startrow, endrow)
+        if result is not RenderCache.MISS:
+            return result
+
+        result = self.disk.get_window(fingerprint, startrow, endrow)
+        if result is None:
+            return RenderCache.MISS
+        return result
+
+    def put(self, fingerprint, table):
+        self.memory.put(fingerprint, table)
+        self.disk.put(fingerprint, table)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+
+render_cache = RenderCache(MemoryRenderCache(settings.RENDER_CACHE_MAX_ENTRIES),
+                           DiskRenderCache(settings.RENDER_CACHE_ROOT, settings.RENDER_CACHE_MAX_BYTES))
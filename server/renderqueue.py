@@ -0,0 +1,84 @@
+# Background rendering
+# When a workflow changes we queue a render job on a channel instead of rendering inside an HTTP request. Channels
+# workers (runserver's worker threads, or `manage.py runworker --only-channels=workflow.render`) pick jobs up, render
+# every module into the render cache, and only then tell clients to reload -- so the /render requests that follow
+# are served from the cache and slow modules never tie up the workers answering other users' requests.
+
+from channels import Channel
+from django.core.cache import caches
+from server.models import Workflow
+from server.websockets import ws_client_rerender_workflow
+import logging
+
+logger = logging.getLogger('django')
+
+RENDER_CHANNEL = 'workflow.render'
+
+# How long a queued job blocks duplicates, in case a worker dies without clearing it
+RENDER_JOB_TIMEOUT = 10 * 60
+
+
+# Keys marking queued jobs. Whichever process queues a job, any process may run it and clear its key, so the keys
+# live in a cache all processes share (the database), not in one process's memory.
+def render_job_cache():
+    return caches['render_jobs']
+
+def render_job_key(workflow_id, revision):
+    return 'render-job-%d-%d' % (workflow_id, revision)
+
+
+# Has a newer revision been committed (or the workflow deleted) since this job was queued?
+# Then its output will never be shown, and the job for the newer revision will announce itself.
+def render_job_superseded(workflow_id, revision):
+    current = Workflow.objects.filter(pk=workflow_id).values_list('last_delta_id', flat=True)
+    if not current:
+        return True
+    return (current[0] or 0) != revision  # same as Workflow.revision(), without loading the workflow
+
+
+# Queue a render of the workflow's current revision. Does nothing if that revision is already queued or rendering.
+def queue_render(workflow):
+    revision = workflow.revision()
+    key = render_job_key(workflow.id, revision)
+    if not render_job_cache().add(key, True, RENDER_JOB_TIMEOUT):
+        return
+
+    channel = Channel(RENDER_CHANNEL)
+    try:
+        channel.send({'workflow_id': workflow.id, 'revision': revision}, immediately=True)
+    except channel.channel_layer.ChannelFull:
+        # Workers are swamped. Don't leave clients waiting for a render that will never be announced;
+        # they will render on demand.
+        render_job_cache().delete(key)
+        ws_client_rerender_workflow(workflow)
+
+
+# Channel consumer: render every module of the workflow, then tell clients new output is ready
+# Jobs for superseded revisions are dropped, before they start or between modules, so when a user types into a
+# parameter only the latest revision's render spends CPU. (A module that is already executing runs to completion.)
+def render_workflow(message):
+    # here to avoid circular import: models -> versions -> execute
+    from server.execute import execute_wfmodule, RenderCancelled
+
+    workflow_id = message.content['workflow_id']
+    revision = message.content['revision']
+
+    workflow = Workflow.objects.filter(pk=workflow_id).first()
+    if workflow is None or workflow.revision() != revision:
+        render_job_cache().delete(render_job_key(workflow_id, revision))
+        return
+
+    try:
+        # rendering the last module renders (and caches) all the modules above it
+        last_wfm = workflow.wf_modules.last()
+        if last_wfm is not None:
+            execute_wfmodule(last_wfm, cancelled=lambda: render_job_superseded(workflow_id, revision))
+    except RenderCancelled:
+        return
+    except Exception:
+        # module code can raise anything; clients will see the error when they request the render themselves
+        logger.exception('Error rendering workflow %d revision %d' % (workflow_id, revision))
+    finally:
+        render_job_cache().delete(render_job_key(workflow_id, revision))
+
+    ws_client_rerender_workflow(workflow)
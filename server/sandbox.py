@@ -0,0 +1,313 @@
+# Sandbox worker processes for user-supplied Python code
+# Python Code modules used to exec user code inside the web process, where an infinite loop or a huge allocation
+# took down a serving worker. Now the code runs in a pool of worker processes. They are forked from a forkserver, a
+# single-threaded helper that has imported this module (so numpy and pandas are already loaded, and there is no
+# interpreter start-up per worker), rather than from the web process with its threads and open connections.
+# Each render gets a wall clock timeout, a CPU time limit and a memory limit; a worker that blows through one is
+# killed and replaced. Tables move in and out as Arrow IPC streams plus JSON, never pickles, so nothing the user code
+# sends back is ever unpickled by the web process.
+
+from django.conf import settings
+from server.usercode import define_user_function
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Raised with a message suitable for showing to the user, e.g. through WfModule.set_error()
+class SandboxError(Exception):
+    pass
+
+
+# ---- Table transfer ----
+# A table goes as a JSON header describing it plus an Arrow IPC stream of its data. Arrow wants string column names,
+# so columns travel as '0', '1'... and the header has the real labels (with their types, so 0 comes back as 0, not
+# '0') and dtypes. Object columns Arrow can't hold, e.g. mixed ints and strings, go in the header as JSON values
+# instead, each with its type; if Arrow can't take the table at all, every column does.
+
+ARROW = 'arrow'
+JSON = 'json'
+NONE = 'none'
+
+JSON_TYPES = {'int': int, 'float': float, 'bool': bool, 'str': str}
+
+# Column label or cell value as [type, value], so JSON doesn't turn it into something else
+def encode_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None:
+        return ['none', None]
+    if isinstance(value, bool):
+        return ['bool', value]
+    if isinstance(value, int):
+        return ['int', value]
+    if isinstance(value, float):
+        return ['float', value]  # NaN is fine: Python's json reads back what it writes
+    return ['str', str(value)]
+
+def decode_value(encoded):
+    type, value = encoded
+    if type == 'none':
+        return None
+    return JSON_TYPES[type](value)
+
+def arrow_compatible(column):
+    if column.dtype != object:
+        return True
+    try:
+        pa.Array.from_pandas(column)
+        return True
+    except (ValueError, TypeError, pa.ArrowException):
+        return False
+
+def write_arrow(table):
+    arrow_table = pa.Table.from_pandas(table)
+    sink = io.BytesIO()
+    writer = pa.RecordBatchStreamWriter(sink, arrow_table.schema)
+    writer.write_table(arrow_table)
+    writer.close()
+    return sink.getvalue()
+
+# Returns (header, payload bytes)
+def table_to_payload(table):
+    if table is None:
+        return ({'format': NONE}, b'')
+
+    header = {
+        'format': ARROW,
+        'rows': len(table),
+        'columns': [encode_value(c) for c in table.columns],
+        'dtypes': [str(t) for t in table.dtypes],
+        'json_columns': {},
+    }
+    names = [str(i) for i in range(len(table.columns))]
+    columns = [table.iloc[:, i] for i in range(len(table.columns))]
+
+    arrow_names = []
+    for name, column in zip(names, columns):
+        if arrow_compatible(column):
+            arrow_names.append(name)
+        else:
+            header['json_columns'][name] = [encode_value(v) for v in column]
+
+    try:
+        arrow_table = pd.DataFrame(dict(zip(names, columns)), index=table.index, columns=arrow_names)
+        return (header, write_arrow(arrow_table))
+    except (ValueError, TypeError, pa.ArrowException):
+        header['format'] = JSON
+        header['json_columns'] = {name: [encode_value(v) for v in column] for name, column in zip(names, columns)}
+        return (header, b'')
+
+def payload_to_table(header, data):
+    if header['format'] == NONE:
+        return None
+
+    if header['format'] == ARROW:
+        arrow_table = pa.RecordBatchStreamReader(pa.BufferReader(data)).read_all().to_pandas()
+        index = arrow_table.index
+    else:
+        arrow_table = None
+        index = pd.RangeIndex(header['rows'])
+
+    columns = []
+    for i, dtype in enumerate(header['dtypes']):
+        name = str(i)
+        if name in header['json_columns']:
+            column = pd.Series([decode_value(v) for v in header['json_columns'][name]], index=index, dtype=object)
+        else:
+            column = arrow_table[name]
+        if str(column.dtype) != dtype:
+            try:
+                column = column.astype(dtype)
+            except (ValueError, TypeError):
+                pass  # close enough
+        columns.append(column)
+
+    table = pd.DataFrame(dict(zip(map(str, range(len(columns))), columns)), index=index,
+                         columns=[str(i) for i in range(len(columns))])
+    table.columns = [decode_value(c) for c in header['columns']]
+    return table
+
+
+# ---- Worker side ----
+
+def limit_memory(max_bytes):
+    # RLIMIT_AS (address space) is what Linux enforces; RLIMIT_RSS is ignored. A worker starts with the forkserver's
+    # address space (numpy, pandas, pyarrow), so allow max_bytes on top of that.
+    try:
+        with open('/proc/self/statm') as f:
+            base = int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        base = 0
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = base + max_bytes
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def limit_cpu(seconds):
+    # RLIMIT_CPU counts from process start, so allow this many seconds more than we've used.
+    # Only the soft limit moves: unprivileged processes can't raise a hard limit back up for the next render.
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(math.ceil(usage.ru_utime + usage.ru_stime)) + seconds
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+# Returns (response header, payload bytes)
+def run_user_code(header, data):
+    try:
+        table = payload_to_table(header['table'], data)
+        process = define_user_function(header['code'], 'process')
+        if process is None:
+            return ({'error': 'Problem defining function'}, b'')
+
+        out = process(table)
+        if out is not None and not isinstance(out, pd.DataFrame):
+            return ({'error': 'process(table) must return a DataFrame'}, b'')
+
+        table_header, out_data = table_to_payload(out)
+        return ({'table': table_header}, out_data)
+    except MemoryError:
+        return ({'error': 'Out of memory (limit %d MB)' % (header['max_memory'] // (1024 * 1024)),
+                 'exit': True}, b'')
+    except Exception as e:
+        return ({'error': str(e)}, b'')
+
+def worker_main(conn, max_memory):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # ctrl-C on runserver is for the parent to handle
+    limit_memory(max_memory)
+
+    while True:
+        try:
+            header = json.loads(conn.recv_bytes().decode('utf-8'))
+            data = conn.recv_bytes()
+        except (EOFError, OSError):
+            return  # pool shut down
+
+        limit_cpu(header['cpu_seconds'])
+        header['max_memory'] = max_memory
+        response, out_data = run_user_code(header, data)
+        del data
+
+        conn.send_bytes(json.dumps(response).encode('utf-8'))
+        conn.send_bytes(out_data)
+
+        if response.get('exit', False):
+            return  # we may be in a bad state after MemoryError; the pool will start a new worker
+
+
+# ---- Parent side ----
+
+# Workers start from the forkserver, never straight from the (threaded) web process. The forkserver itself is started
+# the first time a worker is, with this module already imported.
+def worker_context():
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['server.sandbox'])
+    return context
+
+
+class SandboxWorker:
+    def __init__(self, max_memory):
+        self.max_memory = max_memory
+        context = worker_context()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, max_memory), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def kill(self):
+        if self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGKILL)
+        self.process.join()
+        self.conn.close()
+
+    # Describe why the worker died, once it has
+    def death_message(self, cpu_seconds):
+        self.process.join(1)
+        exitcode = self.process.exitcode
+        if exitcode == -signal.SIGXCPU:
+            return 'Took more than %d seconds of CPU time' % cpu_seconds
+        if exitcode == -signal.SIGKILL:
+            return 'Out of memory (limit %d MB)' % (self.max_memory // (1024 * 1024))
+        return 'Python Code process crashed (exit code %s)' % exitcode
+
+    # Returns (response header, payload bytes). Raises SandboxError, after killing the worker, on timeout or crash.
+    def call(self, header, data, timeout):
+        try:
+            self.conn.send_bytes(json.dumps(header).encode('utf-8'))
+            self.conn.send_bytes(data)
+
+            if not self.conn.poll(timeout):
+                self.kill()
+                raise SandboxError('Took longer than %d seconds' % timeout)
+
+            response = json.loads(self.conn.recv_bytes().decode('utf-8'))
+            out_data = self.conn.recv_bytes()
+        except (EOFError, OSError, ValueError):
+            message = self.death_message(header['cpu_seconds'])
+            self.kill()
+            raise SandboxError(message)
+
+        return response, out_data
+
+
+# A fixed number of workers, each running one render at a time. Renders wait for a free worker, up to their timeout.
+class SandboxPool:
+    def __init__(self, size, max_memory):
+        self.max_memory = max_memory
+        self.idle = queue.Queue()
+        for i in range(size):
+            self.idle.put(SandboxWorker(max_memory))
+
+    # Run Python Code module source (defining process(table)) on table, in a worker. Returns the output table.
+    # Raises SandboxError if the code fails, or exceeds its time or memory limits.
+    def run(self, code, table, timeout, cpu_seconds):
+        table_header, data = table_to_payload(table)
+        header = {'code': code, 'table': table_header, 'cpu_seconds': cpu_seconds}
+
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SandboxError('All Python Code workers are busy, try again later')
+        try:
+            if not worker.is_alive():
+                worker.kill()
+                worker = SandboxWorker(self.max_memory)
+            response, out_data = worker.call(header, data, timeout)
+        except BaseException:
+            # the worker is dead (SandboxError), or mid-conversation with us; either way, start a new one
+            worker.kill()
+            worker = SandboxWorker(self.max_memory)
+            raise
+        finally:
+            self.idle.put(worker)
+
+        if 'error' in response:
+            raise SandboxError(response['error'])
+        return payload_to_table(response['table'], out_data)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# The process-wide pool, started on first use so that processes which never run Python Code don't pay for it
+def sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(settings.PYTHONCODE_WORKERS, settings.PYTHONCODE_MAX_MEMORY)
+        return _pool
@@ -65,7 +65,7 @@ class EnigmaTests(LoggedInTestCase):
         handle_dotcom_url(self.wfmodule, url, split_url, 1000)        
         self.assertEquals("Unable to retrieve the dataset id from request.", self.wfmodule.error_msg)
 
-    @mock.patch('requests.get', side_effect=mock_response)
+    @mock.patch('server.fetch.get', side_effect=mock_response)
     def test_enigma_com_request_response_failure(self, mock_get):
         url = "http://test.com/failure/datasets/dataset_failure/limit/500"
         split_url = urlsplit(url)
@@ -73,10 +73,10 @@ class EnigmaTests(LoggedInTestCase):
         self.assertTrue("Requested resource not found" in self.wfmodule.error_msg)
 
         
-    @mock.patch('requests.get', side_effect=mock_response)
+    @mock.patch('server.fetch.get', side_effect=mock_response)
     def test_enigma_com_request_response_success(self, mock_get):
         url = "http://test.com/success/datasets/dataset_success/limit/500"
         split_url = urlsplit(url)
-        returned = handle_dotcom_url(self.wfmodule, url, split_url, 500)
+        returned, response = handle_dotcom_url(self.wfmodule, url, split_url, 500)
         self.assertTrue(len(returned) == 2) # make sure we have all the data
         self.assertTrue(list(returned.columns.values) == ['A', 'B', 'C']) # make sure we set the header
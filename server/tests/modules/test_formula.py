@@ -1,5 +1,6 @@
 from django.test import TestCase
 from server.views.WfModule import make_render_json
+from server.modules.formula import Formula, is_vectorizable
 from server.tests.utils import *
 
 # ---- Formula ----
@@ -45,3 +46,41 @@ class FormulaTests(LoggedInTestCase):
         self.wfmodule.refresh_from_db()
         self.assertEqual(self.wfmodule.status, WfModule.ERROR)
         self.assertEqual(response.content, make_render_json(pd.DataFrame()))
+
+    # Whole-column evaluation must give the same output as evaluating row by row
+    def test_vectorized_formula(self):
+        self.rpval.value = 'output'
+        self.rpval.save()
+
+        table = pd.DataFrame({'A': [1, 2, 3], 'B': [2.5, np.nan, -1.0], 'C': ['x', 'y', 'z']})
+        cases = [
+            ('A*2', [2.0, 4.0, 6.0]),
+            ('-A + B / 2', [0.25, np.nan, -3.5]),
+            ('A % 2 == 1', [1.0, 0.0, 1.0]),
+            ('B > A', [1.0, 0.0, 0.0]),
+            ('7', [7.0, 7.0, 7.0]),
+            ('A ** -1', [1.0, 0.5, 1/3]),
+            ('A ** 63', [1.0, 2.0 ** 63, 3.0 ** 63]),  # would overflow int64
+            ('np.abs(B)', [2.5, np.nan, 1.0]),  # function call, not vectorized
+        ]
+        for formula, expected in cases:
+            self.fpval.value = formula
+            self.fpval.save()
+            out = Formula.render(self.wfmodule, table.copy())
+            self.assertTrue(np.allclose(out['output'], expected, equal_nan=True), formula)
+            self.assertEqual(out['output'].dtype, np.float64)
+
+        # numpy gives inf and NaN for these, Python raises, and so must we
+        for formula in ['A / (A - 2)', 'A // (A - 2)', 'A % (A - 2)']:
+            self.fpval.value = formula
+            self.fpval.save()
+            self.assertIsNone(Formula.render(self.wfmodule, table.copy()), formula)
+            self.wfmodule.refresh_from_db()
+            self.assertEqual(self.wfmodule.status, WfModule.ERROR)
+            self.assertIn('division', self.wfmodule.error_msg)
+
+        self.assertTrue(is_vectorizable('A*2 + B', ['A', 'B']))
+        self.assertFalse(is_vectorizable('A*2 + D', ['A', 'B']))
+        self.assertFalse(is_vectorizable('C == "x"', ['C']))
+        self.assertFalse(is_vectorizable('1 < A < 3', ['A']))
+        self.assertFalse(is_vectorizable('str(A)', ['A']))
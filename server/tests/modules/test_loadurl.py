@@ -3,7 +3,10 @@ from rest_framework import status
 from server.models import Module, WfModule, Workflow, ParameterSpec, ParameterVal
 from server.views.WfModule import make_render_json
 from server.execute import execute_wfmodule
+from server.modules.loadurl import json_to_table
 from server.tests.utils import *
+from unittest import mock
+import requests
 import requests_mock
 import pandas as pd
 import io
@@ -101,6 +104,69 @@ class LoadFromURLTests(LoggedInTestCase):
             self.assertEqual(self.wfmodule.status, WfModule.ERROR)
 
 
+    def test_load_not_modified(self):
+        url = 'http://test.com/the.csv'
+        self.url_pval.set_value(url)
+        self.url_pval.save()
+        validators = {'content-type': 'text/csv', 'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+        with requests_mock.Mocker() as m:
+            m.get(url, text=mock_csv_text, headers=validators)
+            self.press_fetch_button()
+            self.assertNotIn('If-None-Match', m.last_request.headers)
+        self.wfmodule.refresh_from_db()
+        first_version = self.wfmodule.get_stored_data_version()
+        first_check_time = self.wfmodule.last_update_check
+
+        # next fetch is conditional, and a 304 keeps our data
+        with requests_mock.Mocker() as m:
+            m.get(url, status_code=304)
+            self.press_fetch_button()
+            self.assertEqual(m.last_request.headers['If-None-Match'], '"v1"')
+            self.assertEqual(m.last_request.headers['If-Modified-Since'], 'Wed, 21 Oct 2015 07:28:00 GMT')
+        self.wfmodule.refresh_from_db()
+        self.assertEqual(self.wfmodule.status, WfModule.READY)
+        self.assertEqual(self.wfmodule.get_stored_data_version(), first_version)
+        self.assertNotEqual(self.wfmodule.last_update_check, first_check_time)
+        response = self.get_render()
+        self.assertEqual(response.content, make_render_json(mock_csv_table))
+
+        # validators don't apply once the parameters change
+        self.path_pval.set_value('data')
+        self.path_pval.save()
+        with requests_mock.Mocker() as m:
+            m.get(url, text=mock_csv_text, headers=validators)
+            self.press_fetch_button()
+            self.assertNotIn('If-None-Match', m.last_request.headers)
+
+    def test_load_same_body(self):
+        url = 'http://test.com/the.csv'
+        self.url_pval.set_value(url)
+        self.url_pval.save()
+
+        with requests_mock.Mocker() as m:
+            m.get(url, text=mock_csv_text, headers={'content-type': 'text/csv'})
+            self.press_fetch_button()
+        self.wfmodule.refresh_from_db()
+        first_version = self.wfmodule.get_stored_data_version()
+
+        # the same bytes aren't parsed again
+        with requests_mock.Mocker() as m, mock.patch('pandas.read_csv') as read_csv:
+            m.get(url, text=mock_csv_text, headers={'content-type': 'text/csv'})
+            self.press_fetch_button()
+            self.assertEqual(read_csv.call_count, 0)
+
+        # different bytes, same table: parsed, but not serialized or stored
+        with requests_mock.Mocker() as m, \
+                mock.patch('server.modules.utils.StoredObject.table_to_payload') as table_to_payload:
+            m.get(url, text=mock_csv_text + '\n', headers={'content-type': 'text/csv'})
+            self.press_fetch_button()
+            self.assertEqual(table_to_payload.call_count, 0)
+
+        self.wfmodule.refresh_from_db()
+        self.assertEqual(self.wfmodule.status, WfModule.READY)
+        self.assertEqual(self.wfmodule.get_stored_data_version(), first_version)
+
     def test_load_json(self):
         url = 'http://test.com/the.json'
         self.url_pval.set_value(url)
@@ -174,4 +240,44 @@ class LoadFromURLTests(LoggedInTestCase):
             self.wfmodule.refresh_from_db()
             self.assertEqual(self.wfmodule.status, WfModule.ERROR)
 
+    def test_load_timeout(self):
+        url = 'http://test.com/the.csv'
+        self.url_pval.set_value(url)
+        self.url_pval.save()
+
+        # a server that doesn't answer puts the module in error state, instead of hanging
+        with requests_mock.Mocker() as m:
+            m.get(url, exc=requests.exceptions.ReadTimeout)
+            self.press_fetch_button()
+            self.wfmodule.refresh_from_db()
+            self.assertEqual(self.wfmodule.status, WfModule.ERROR)
+            self.assertEqual(self.wfmodule.error_msg, 'Timed out fetching %s' % url)
+
+    def test_json_to_table(self):
+        def json_table(obj, path):
+            return json_to_table(io.BytesIO(json.dumps(obj).encode('utf-8')), path)
+
+        rows = [{'Month': 'Jan', 'Amount': 10, 'Rate': 0.5}, {'Month': 'Feb', 'Amount': 20}, {'Month': 'Mar'}]
+        doc = {'junk': [{'a': 1}, [1, 2]], 'data': {'series': [{'key': 'value'}, rows]}}
+
+        # same table as parsing the whole thing, whatever the batch size
+        expected = pd.DataFrame(rows)
+        self.assertTrue(json_table(doc, 'data.series[1]').equals(expected))
+        with mock.patch('server.modules.loadurl.JSON_BATCH_ROWS', 2):
+            self.assertTrue(json_table(doc, 'data.series[1]').equals(expected))
+        self.assertTrue(json_table(rows, '').equals(expected))
+
+        # a value that isn't rows
+        self.assertTrue(json_table({'a': [1, 2], 'b': [3, 4]}, '').equals(pd.DataFrame({'a': [1, 2], 'b': [3, 4]})))
+
+        for path in ['data.series[2]', 'data.nothing', 'junk.a', 'data[0]']:
+            with self.assertRaises(KeyError):
+                json_table(doc, path)
+
+        with self.assertRaises(ValueError):
+            json_to_table(io.BytesIO(b"there's just no way this is json"), '')
 
+        # the rest of the body is read too: trailing data and truncation are errors, as they are for json.load
+        for body in [b'[{"a": 1}] garbage', b'{"data": [{"a": 1}], "more": [1, ', b'{"a": [1, 2]}{}']:
+            with self.assertRaises(ValueError):
+                json_to_table(io.BytesIO(body), 'data' if body.startswith(b'{"data"') else '')
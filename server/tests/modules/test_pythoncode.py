@@ -1,6 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from server.tests.utils import *
 from server.execute import execute_wfmodule
+from server.modules.utils import define_user_function
+from server.sandbox import SandboxError, SandboxPool, payload_to_table, table_to_payload
+import numpy as np
 
 # ---- Python Code  ----
 
@@ -22,3 +25,69 @@ class PythonCodeTest(LoggedInTestCase):
         out = execute_wfmodule(self.wf_module)
         self.assertEqual(str(out), "   A  B  C\n0  0  0  0\n1  1  1  1\n2  2  2  2\n3  3  3  3\n4  4  4  4")
 
+
+    def test_compile_once(self):
+        define_user_function.cache_clear()
+        code = 'def process(table):\n  return table'
+        f1 = define_user_function(code, 'process')
+        f2 = define_user_function(code, 'process')
+        self.assertIs(f1, f2)
+        self.assertEqual(define_user_function.cache_info().hits, 1)
+
+        # errors are reported every time, not cached
+        for i in range(2):
+            with self.assertRaises(SyntaxError):
+                define_user_function('def process(table):\n  return )', 'process')
+
+    def test_error(self):
+        self.code_pval.value = 'return table.nonexistent_method()'
+        self.code_pval.save()
+
+        out = execute_wfmodule(self.wf_module)
+        self.wf_module.refresh_from_db()
+        self.assertEqual(self.wf_module.status, WfModule.ERROR)
+        self.assertTrue(out.empty)
+
+    @override_settings(PYTHONCODE_TIMEOUT=1)
+    def test_timeout(self):
+        self.code_pval.value = 'while True:\n  pass'
+        self.code_pval.save()
+
+        execute_wfmodule(self.wf_module)
+        self.wf_module.refresh_from_db()
+        self.assertEqual(self.wf_module.status, WfModule.ERROR)
+        self.assertEqual(self.wf_module.error_msg, 'Took longer than 1 seconds')
+
+        # the killed worker was replaced
+        self.code_pval.value = 'return pd.DataFrame({"A": [1]})'
+        self.code_pval.save()
+        out = execute_wfmodule(self.wf_module)
+        self.assertEqual(list(out['A']), [1])
+
+    def test_column_labels_and_types(self):
+        # int column names and mixed-type object columns come back as they were, not as strings
+        self.code_pval.value = 'return pd.DataFrame({0: [1, 2], 1: ["a", 3], "s": pd.Series(["x", "y"], dtype="category")}, columns=[0, 1, "s"])'
+        self.code_pval.save()
+
+        out = execute_wfmodule(self.wf_module)
+        self.assertEqual(list(out.columns), [0, 1, 's'])
+        self.assertEqual(list(out[0]), [1, 2])
+        self.assertEqual(list(out[1]), ['a', 3])
+        self.assertEqual(str(out['s'].dtype), 'category')
+
+    def test_table_transfer(self):
+        table = pd.DataFrame({'A': [1, 2], 'B': [1.5, np.nan], 'C': [True, 'x'], 'D': [None, 'y']})
+        out = payload_to_table(*table_to_payload(table))
+        self.assertTrue(out.equals(table))
+        self.assertEqual(list(out.dtypes), list(table.dtypes))
+
+        self.assertIsNone(payload_to_table(*table_to_payload(None)))
+
+    def test_all_workers_busy(self):
+        pool = SandboxPool(1, 100 * 1024 * 1024)
+        worker = pool.idle.get()  # as if another render had it
+        try:
+            with self.assertRaisesRegex(SandboxError, 'busy'):
+                pool.run('def process(table):\n  return table', None, timeout=0.1, cpu_seconds=1)
+        finally:
+            worker.kill()
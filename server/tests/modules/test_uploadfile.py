@@ -0,0 +1,121 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from server.models import StoredObject
+from server.execute import execute_wfmodule
+from server.tests.utils import *
+from unittest import mock
+import pandas as pd
+import tempfile
+
+mock_xslx_path = os.path.join(settings.BASE_DIR, 'server/tests/modules/test.xlsx')
+
+@override_settings(MEDIA_ROOT=tempfile.gettempdir())
+class UploadFileTests(LoggedInTestCase):
+    def setUp(self):
+        super(UploadFileTests, self).setUp()  # log in
+        uploadfile_def = load_module_def('uploadfile')
+        self.wfmodule = load_and_add_module(None, uploadfile_def)
+
+    def upload(self, name, content):
+        return self.client.post('/api/uploadfile', {
+            'wf_module': self.wfmodule.id,
+            'file': SimpleUploadedFile(name, content),
+            'name': name,
+            'size': len(content),
+            'uuid': 'e9e8a9b5-3c6e-4e8e-a9b1-ad2e3f5bdd36'
+        })
+
+    def test_upload_csv(self):
+        response = self.upload('test.csv', bytes(mock_csv_text, 'utf-8'))
+        self.assertEqual(response.status_code, 200)
+
+        # the file is parsed once, and stored as a table
+        self.wfmodule.refresh_from_db()
+        stored_object = self.wfmodule.retrieve_stored_object()
+        self.assertEqual(stored_object.type, StoredObject.PARQUET)
+        self.assertEqual(stored_object.name, 'test.csv')
+
+        self.wfmodule.set_error('Old error', notify=False)  # rendering the upload clears it
+        with mock.patch('pandas.read_csv') as read_csv:
+            result = execute_wfmodule(self.wfmodule)
+            self.assertEqual(read_csv.call_count, 0)
+        self.assertTrue(result.equals(mock_csv_table))
+        self.wfmodule.refresh_from_db()
+        self.assertEqual(self.wfmodule.status, WfModule.READY)
+
+    def test_upload_xlsx(self):
+        with open(mock_xslx_path, 'rb') as file:
+            content = file.read()
+        response = self.upload('test.xlsx', content)
+        self.assertEqual(response.status_code, 200)
+
+        self.wfmodule.refresh_from_db()
+        self.assertTrue(execute_wfmodule(self.wfmodule).equals(pd.read_excel(mock_xslx_path)))
+
+    def test_upload_unknown_type(self):
+        response = self.upload('test.txt', b'Some text')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))['error'], 'Unknown file type.')
+
+        self.wfmodule.refresh_from_db()
+        self.assertIsNone(self.wfmodule.retrieve_stored_object())
+
+    @override_settings(UPLOAD_PARTS_ROOT=os.path.join(tempfile.gettempdir(), 'uploadparts'))
+    def test_upload_chunked(self):
+        upload_uuid = 'e9e8a9b5-3c6e-4e8e-a9b1-ad2e3f5bdd36'
+        content = bytes(mock_csv_text, 'utf-8')
+        parts = [content[:10], content[10:20], content[20:]]
+
+        def send_part(index):
+            return self.client.post('/api/uploadfile', {
+                'wf_module': self.wfmodule.id,
+                'file': SimpleUploadedFile('blob', parts[index]),
+                'name': 'test.csv',
+                'size': len(content),
+                'uuid': upload_uuid,
+                'qqpartindex': index,
+                'qqtotalparts': len(parts)
+            })
+
+        def send_done():
+            return self.client.post('/api/uploadfile', {
+                'wf_module': self.wfmodule.id,
+                'name': 'test.csv',
+                'size': len(content),
+                'uuid': upload_uuid,
+                'qqtotalparts': len(parts)
+            })
+
+        self.assertEqual(send_part(0).status_code, 200)
+        self.assertEqual(send_part(1).status_code, 200)
+
+        # connection dropped, then resumed: a part sent again replaces the first try
+        self.assertEqual(send_part(1).status_code, 200)
+        self.assertEqual(send_part(2).status_code, 200)
+        self.assertEqual(send_done().status_code, 200)
+
+        self.wfmodule.refresh_from_db()
+        self.assertTrue(execute_wfmodule(self.wfmodule).equals(mock_csv_table))
+        self.assertEqual(self.wfmodule.retrieve_stored_object().name, 'test.csv')
+
+        # parts are gone once assembled
+        self.assertFalse(os.path.exists(os.path.join(settings.UPLOAD_PARTS_ROOT, upload_uuid)))
+
+    @override_settings(UPLOAD_PARTS_ROOT=os.path.join(tempfile.gettempdir(), 'uploadparts'))
+    def test_upload_chunked_missing_part(self):
+        upload_uuid = 'e9e8a9b5-3c6e-4e8e-a9b1-ad2e3f5bdd37'
+        self.client.post('/api/uploadfile', {
+            'wf_module': self.wfmodule.id,
+            'file': SimpleUploadedFile('blob', b'Month,Amount\n'),
+            'uuid': upload_uuid,
+            'qqpartindex': 0,
+            'qqtotalparts': 2
+        })
+        response = self.client.post('/api/uploadfile', {
+            'wf_module': self.wfmodule.id,
+            'name': 'test.csv',
+            'uuid': upload_uuid,
+            'qqtotalparts': 2
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))['error'], 'Upload is missing 1 of 2 parts')
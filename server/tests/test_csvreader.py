@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+from pandas.parser import CParserError
+from server import csvreader
+from server.csvreader import read_csv
+from unittest import mock, skipIf
+import pandas as pd
+import io
+
+class CsvReaderTests(SimpleTestCase):
+    def assert_same_as_pandas(self, text, **kwargs):
+        expected = pd.read_csv(io.StringIO(text), **kwargs)
+        self.assertTrue(read_csv(text, **kwargs).equals(expected))
+        self.assertTrue(read_csv(text.encode('utf-8'), **kwargs).equals(expected))
+        self.assertTrue(read_csv(io.BytesIO(text.encode('utf-8')), **kwargs).equals(expected))
+
+    def test_read_csv(self):
+        self.assert_same_as_pandas('Month,Amount,Note\nJan,10,\nFeb,20.5,late\n')
+        self.assert_same_as_pandas('Jan,10\nFeb,20\n', header=None)
+        self.assert_same_as_pandas('Month, Amount\nJan, 10\n', skipinitialspace=True)
+
+    def test_same_as_pandas_where_arrow_differs(self):
+        self.assert_same_as_pandas('A,B,C\n1,2\n3,4,5\n')        # missing fields
+        self.assert_same_as_pandas('A,A\n1,2\n')                 # duplicate names
+        self.assert_same_as_pandas('Date\n2017-10-01\n')         # dates stay text
+        self.assert_same_as_pandas('Time\n2017-10-01T10:00:00\n')  # and timestamps
+        self.assert_same_as_pandas('A,,C\n1,2,3\n')              # blank names are 'Unnamed: 1'
+        self.assert_same_as_pandas('A\n18446744073709551615\n')  # uint64
+
+    def test_error(self):
+        with self.assertRaises(CParserError):
+            read_csv('A,B\n1,2\n3,4,5\n')
+
+
+# Skipped with the pinned pyarrow 0.7.1, which has no CSV parser (read_csv() always uses pandas). They run, and must
+# pass, once pyarrow is upgraded.
+@skipIf(csvreader.pacsv is None, 'pyarrow has no CSV parser we can use')
+class ArrowCsvReaderTests(SimpleTestCase):
+    def assert_arrow_same_as_pandas(self, text, header=0):
+        expected = pd.read_csv(io.StringIO(text), header=header)
+        result = csvreader.read_csv_arrow(csvreader.arrow_input(text), header)
+        self.assertEqual(list(result.columns), list(expected.columns))
+        self.assertEqual(list(result.dtypes), list(expected.dtypes))
+        self.assertTrue(result.equals(expected))
+
+    def test_read_csv_arrow(self):
+        self.assert_arrow_same_as_pandas('Month,Amount,Note\nJan,10,\nFeb,20.5,late\n')
+        self.assert_arrow_same_as_pandas('Jan,10\nFeb,20\n', header=None)
+        self.assert_arrow_same_as_pandas('A,B\n1,x\n,y\n3,\n')                  # missing values
+        self.assert_arrow_same_as_pandas('A,B\n"a, b",1\n"say ""hi""",2\n')     # quoting
+
+        # tables Arrow reads differently are left to pandas
+        for text in ['Date\n2017-10-01\n', 'Time\n2017-10-01T10:00:00\n', 'A,,C\n1,2,3\n', 'A,A\n1,2\n',
+                     'A\n18446744073709551615\n']:
+            with self.assertRaises(ValueError):
+                csvreader.read_csv_arrow(csvreader.arrow_input(text), 0)
+
+    def test_read_csv_uses_arrow(self):
+        text = 'Month,Amount\nJan,10\n'
+        for source in [text, text.encode('utf-8'), io.BytesIO(text.encode('utf-8'))]:
+            with mock.patch('server.csvreader.read_csv_pandas') as read_csv_pandas:
+                self.assertTrue(read_csv(source).equals(pd.read_csv(io.StringIO(text))))
+                self.assertEqual(read_csv_pandas.call_count, 0)
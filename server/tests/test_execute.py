@@ -0,0 +1,99 @@
+from unittest import mock
+from server.dispatch import module_dispatch_render
+from server.execute import execute_wfmodule, execute_wfmodule_window, fingerprint_stack, wfmodule_fingerprint, \
+    render_cache
+from server.tests.utils import *
+from server.tests.test_wfmodule import WfModuleTestsBase
+import server.execute
+
+class ExecuteTests(WfModuleTestsBase):
+
+    def setUp(self):
+        render_cache.clear()
+        self.createTestWorkflow()
+
+    def test_render_cache(self):
+        double_test_data = self.test_table.copy()
+        double_test_data['M'] *= 2
+
+        with mock.patch('server.execute.module_dispatch_render',
+                        side_effect=server.execute.module_dispatch_render) as render:
+            # first render runs every module
+            out = execute_wfmodule(self.wfmodule3)
+            self.assertTrue(out.equals(double_test_data))
+            self.assertEqual(render.call_count, 3)
+
+            # nothing changed, so nothing is re-executed, and modules can't modify the cached table
+            out = execute_wfmodule(self.wfmodule3)
+            self.assertTrue(out.equals(double_test_data))
+            self.assertEqual(render.call_count, 3)
+
+            # upstream output is also cached
+            out = execute_wfmodule(self.wfmodule2)
+            self.assertTrue(out.equals(self.test_table))
+            self.assertEqual(render.call_count, 3)
+
+            # changing a parameter of the second module re-executes the second and third modules only
+            self.wfmodule2.create_default_parameters()
+            pval = ParameterVal.objects.get(parameter_spec=self.pspec21, wf_module=self.wfmodule2)
+            pval.set_value('bar')
+            render.reset_mock()
+            out = execute_wfmodule(self.wfmodule3)
+            self.assertTrue(out.equals(double_test_data))
+            self.assertEqual(render.call_count, 2)
+
+            # changing the first module re-executes everything
+            pval = ParameterVal.objects.get(parameter_spec=self.pspec11, wf_module=self.wfmodule1)
+            pval.set_value('M,F\n1,2')
+            render.reset_mock()
+            out = execute_wfmodule(self.wfmodule3)
+            self.assertEqual(list(out['M']), [2])
+            self.assertEqual(render.call_count, 3)
+
+    def test_execute_window(self):
+        double_test_data = self.test_table.copy()
+        double_test_data['M'] *= 2
+
+        # first call renders, later calls slice the cached output
+        for i in range(2):
+            window, total_rows = execute_wfmodule_window(self.wfmodule3, 1, 3)
+            self.assertEqual(total_rows, 4)
+            self.assertTrue(window.equals(double_test_data[1:3]))
+
+        window, total_rows = execute_wfmodule_window(self.wfmodule3, -5, None)
+        self.assertEqual(total_rows, 4)
+        self.assertTrue(window.equals(double_test_data))
+
+    def test_render_cache_error(self):
+        # the second module errors: neither it nor anything below it is cached
+        def render(wfm, table):
+            if wfm == self.wfmodule2:
+                wfm.set_error('Bad input', notify=False)
+            return module_dispatch_render(wfm, table)
+
+        with mock.patch('server.execute.module_dispatch_render', side_effect=render) as mock_render:
+            execute_wfmodule(self.wfmodule3)
+            self.assertEqual(mock_render.call_count, 3)
+
+            # so the next render re-executes both
+            mock_render.reset_mock()
+            execute_wfmodule(self.wfmodule3)
+            self.assertEqual(mock_render.call_count, 2)
+
+    def test_fingerprint_code_version(self):
+        # a deploy that changes our code changes every fingerprint, so nothing the old code rendered is reused
+        wfms, fingerprints = fingerprint_stack(self.wfmodule3)
+        self.assertEqual(fingerprint_stack(self.wfmodule3)[1], fingerprints)
+        with mock.patch('server.execute.code_version', return_value='next release'):
+            new_fingerprints = fingerprint_stack(self.wfmodule3)[1]
+        self.assertFalse(set(new_fingerprints) & set(fingerprints))
+
+    def test_fingerprint_parameters_unambiguous(self):
+        # values that would run together into the same bytes still fingerprint differently
+        def fingerprint(id_values):
+            with mock.patch.object(self.wfmodule2, 'load_parameters') as load_parameters:
+                load_parameters.return_value.id_values.return_value = id_values
+                return wfmodule_fingerprint(self.wfmodule2, '')
+
+        self.assertNotEqual(fingerprint([(1, 'a|2=b'), (2, 'c')]), fingerprint([(1, 'a'), (2, 'b|2=c')]))
+        self.assertEqual(fingerprint([(1, 'a'), (2, 'b')]), fingerprint([(1, 'a'), (2, 'b')]))
@@ -0,0 +1,48 @@
+from django.test import SimpleTestCase, override_settings
+from server import fetch
+import requests_mock
+
+class FetchTests(SimpleTestCase):
+    def test_get(self):
+        with requests_mock.Mocker() as m:
+            m.get('http://test.com/data.json', text='{"a": 1}')
+            response = fetch.get('http://test.com/data.json')
+        self.assertEqual(response.json(), {'a': 1})
+
+        # connections come from one shared pool
+        self.assertIs(fetch.session(), fetch.session())
+
+    @override_settings(FETCH_MAX_BYTES=10)
+    def test_max_bytes(self):
+        with requests_mock.Mocker() as m:
+            # size known up front
+            m.get('http://test.com/big', text='x' * 11, headers={'content-length': '11'})
+            with self.assertRaisesMessage(fetch.FetchError, 'is too large'):
+                fetch.get('http://test.com/big')
+
+            # size found out while reading
+            m.get('http://test.com/big', text='x' * 11)
+            with self.assertRaisesMessage(fetch.FetchError, 'is too large'):
+                fetch.get('http://test.com/big')
+
+            m.get('http://test.com/small', text='x' * 10)
+            self.assertEqual(fetch.get('http://test.com/small').text, 'x' * 10)
+
+    def test_host_slots_released(self):
+        with requests_mock.Mocker() as m:
+            m.get('http://test.com/404', status_code=404)
+            m.get('http://test.com/timeout', exc=fetch.requests.exceptions.ConnectTimeout)
+            for i in range(10):
+                self.assertEqual(fetch.get('http://test.com/404').status_code, 404)
+                with self.assertRaises(fetch.FetchError):
+                    fetch.get('http://test.com/timeout')
+
+    def test_no_cookies(self):
+        # the session is shared by all users' fetches, so one fetch's cookies must not go out with the next
+        with requests_mock.Mocker() as m:
+            m.get('http://test.com/login', text='ok', headers={'Set-Cookie': 'session=secret; Path=/'})
+            m.get('http://test.com/data', text='data')
+            fetch.get('http://test.com/login')
+            fetch.get('http://test.com/data')
+            self.assertNotIn('Cookie', m.request_history[-1].headers)
+        self.assertEqual(len(fetch.session().cookies), 0)
@@ -0,0 +1,54 @@
+from django.test import SimpleTestCase
+from server.rendercache import DiskRenderCache
+from server.tests.utils import *
+import os
+import tempfile
+import time
+
+class DiskRenderCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = DiskRenderCache(self.tempdir.name, 1024*1024)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_roundtrip(self):
+        self.assertIsNone(self.cache.get('abc'))
+
+        # non-default index must survive, downstream modules may align on it
+        table = mock_csv_table2[mock_csv_table2['Amount'] > 100]
+        self.cache.put('abc', table)
+        self.assertTrue(self.cache.get('abc').equals(table))
+
+        # int column names (no header row) are not persisted
+        self.cache.put('def', pd.read_csv(io.StringIO(mock_csv_text), header=None))
+        self.assertIsNone(self.cache.get('def'))
+
+    def test_window(self):
+        self.cache.batch_rows = 2
+        table = pd.DataFrame({'A': list(range(7)), 'B': [str(i) for i in range(7)]})
+        self.cache.put('abc', table)
+
+        for startrow, endrow in [(0, 7), (1, 4), (2, 4), (3, 3), (5, None), (6, 100)]:
+            window, total_rows = self.cache.get_window('abc', startrow, endrow)
+            self.assertEqual(total_rows, 7)
+            self.assertTrue(window.equals(table.iloc[startrow:endrow]))
+
+        self.assertIsNone(self.cache.get_window('def', 0, 10))
+
+    def test_evict_lru(self):
+        self.cache.put('a', mock_csv_table)
+        size = os.path.getsize(self.cache.path_for('a'))
+        self.cache.max_bytes = 2 * size
+
+        self.cache.put('b', mock_csv_table)
+        os.utime(self.cache.path_for('a'), (time.time() - 60, time.time() - 60))
+        os.utime(self.cache.path_for('b'), (time.time() - 30, time.time() - 30))
+        self.cache.get('a')    # a is now most recently used
+
+        self.cache.put('c', mock_csv_table)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
@@ -0,0 +1,86 @@
+from unittest import mock
+from channels.tests import ChannelTestCase, HttpClient
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from server.execute import execute_wfmodule, render_cache
+from server.renderqueue import queue_render, render_workflow, RENDER_CHANNEL
+from server.websockets import ws_flush_workflow_updates
+from server.models import ChangeWorkflowTitleCommand
+from server.tests.utils import *
+from server.tests.test_wfmodule import WfModuleTestsBase
+
+class RenderQueueTests(ChannelTestCase, WfModuleTestsBase):
+    def setUp(self):
+        render_cache.clear()
+        cache.clear()
+        self.createTestWorkflow()
+
+    def test_render_job(self):
+        client = HttpClient()
+        client.send_and_consume('websocket.connect', path='/workflow/%d' % self.workflow1.id)
+
+        # two requests for the same revision make one job
+        queue_render(self.workflow1)
+        queue_render(self.workflow1)
+        message = self.get_next_message(RENDER_CHANNEL, require=True)
+        self.assertIsNone(self.get_next_message(RENDER_CHANNEL))
+
+        # clients are told to reload only once the job is done
+        self.assertIsNone(client.receive())
+        render_workflow(message)
+        ws_flush_workflow_updates()
+        self.assertEqual(client.receive(), {'type': 'reload-workflow', 'revision': self.workflow1.revision()})
+
+        # and their renders are served from the cache
+        with mock.patch('server.execute.module_dispatch_render') as render:
+            execute_wfmodule(self.wfmodule3)
+            self.assertEqual(render.call_count, 0)
+
+        # finished jobs don't block new ones
+        queue_render(self.workflow1)
+        self.assertIsNotNone(self.get_next_message(RENDER_CHANNEL))
+
+    def test_render_job_in_another_process(self):
+        # Each process has its own cache object; the job's key must still be cleared for the process that queued it
+        web_process_cache = DatabaseCache('render_job_cache', {})
+        worker_process_cache = DatabaseCache('render_job_cache', {})
+
+        with mock.patch('server.renderqueue.render_job_cache', return_value=web_process_cache):
+            queue_render(self.workflow1)
+        message = self.get_next_message(RENDER_CHANNEL, require=True)
+
+        with mock.patch('server.renderqueue.render_job_cache', return_value=worker_process_cache):
+            render_workflow(message)
+
+        # the same revision can be queued again, e.g. after a fetch that found no new data
+        with mock.patch('server.renderqueue.render_job_cache', return_value=web_process_cache):
+            queue_render(self.workflow1)
+        self.assertIsNotNone(self.get_next_message(RENDER_CHANNEL))
+
+    def test_superseded_render_job(self):
+        client = HttpClient()
+        client.send_and_consume('websocket.connect', path='/workflow/%d' % self.workflow1.id)
+
+        queue_render(self.workflow1)
+        message = self.get_next_message(RENDER_CHANNEL, require=True)
+
+        # a new revision is committed before the job runs: job is dropped without rendering or notifying
+        ChangeWorkflowTitleCommand.create(self.workflow1, 'New Title')
+        with mock.patch('server.execute.module_dispatch_render') as render:
+            render_workflow(message)
+            self.assertEqual(render.call_count, 0)
+        ws_flush_workflow_updates()
+        self.assertIsNone(client.receive())
+
+    def test_cancel_render_between_modules(self):
+        queue_render(self.workflow1)
+        message = self.get_next_message(RENDER_CHANNEL, require=True)
+
+        # a new revision is committed while the first module renders: later modules are skipped
+        def commit_new_revision(wfm, table):
+            ChangeWorkflowTitleCommand.create(self.workflow1, 'New Title')
+            return table
+
+        with mock.patch('server.execute.module_dispatch_render', side_effect=commit_new_revision) as render:
+            render_workflow(message)
+            self.assertEqual(render.call_count, 1)
@@ -1,4 +1,5 @@
 from django.test import TestCase
+from django.core.files.storage import default_storage
 from server.models import StoredObject
 from server.tests.utils import *
 
@@ -14,7 +15,86 @@ class StoredObjectTests(TestCase):
         so1 = StoredObject.create(self.wfm1, "Stored Text")
         so2 = so1.duplicate(self.wfm2)
 
-        # new StoredObject should have same time, different file with same contents
+        # new StoredObject should have same time, and share the file
         self.assertEqual(so1.stored_at, so2.stored_at)
-        self.assertNotEqual(so1.file, so2.file)
+        self.assertEqual(so1.file, so2.file)
         self.assertEqual(so1.get_data(), so2.get_data())
+
+    def test_deduplicate(self):
+        so1 = StoredObject.create(self.wfm1, "Stored Text")
+        so2 = StoredObject.create(self.wfm2, "Stored Text")
+        so3 = StoredObject.create(self.wfm1, "Other Text")
+        self.assertEqual(so1.hash, so2.hash)
+        self.assertEqual(so1.file.name, so2.file.name)
+        self.assertNotEqual(so1.file.name, so3.file.name)
+
+        # file is only deleted when its last StoredObject is
+        path = so1.file.path
+        so1.delete()
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(so2.get_data(), "Stored Text")
+        so2.delete()
+        self.assertFalse(os.path.isfile(path))
+
+    def test_table(self):
+        # Parquet keeps dtypes, and duplicates keep the format
+        so1 = StoredObject.create_table(self.wfm1, mock_csv_table)
+        self.assertEqual(so1.type, StoredObject.PARQUET)
+        self.assertTrue(so1.get_table().equals(mock_csv_table))
+        so2 = so1.duplicate(self.wfm2)
+        self.assertEqual(so2.type, StoredObject.PARQUET)
+        self.assertTrue(so2.get_table().equals(mock_csv_table))
+
+        # tables Parquet can't hold are stored as CSV text
+        table = pd.read_csv(io.StringIO(mock_csv_text), header=None)
+        so3 = StoredObject.create_table(self.wfm1, table)
+        self.assertEqual(so3.type, StoredObject.TEXT)
+        self.assertEqual(so3.get_data(), table.to_csv(index=False))
+
+        # CSV text from before Parquet still loads as a table
+        so4 = StoredObject.create(self.wfm1, mock_csv_text)
+        self.assertTrue(so4.get_table().equals(mock_csv_table))
+
+    def test_append_table(self):
+        def tweets(ids):
+            return pd.DataFrame({'id': ids, 'text': ['tweet %d' % i for i in ids]})
+
+        files_before = set(default_storage.listdir('')[1])
+
+        so1 = StoredObject.append_table(self.wfm1, None, tweets([2, 1]))
+        so2 = StoredObject.append_table(self.wfm1, so1, tweets([4, 3]))
+        so3 = StoredObject.append_table(self.wfm1, so2, tweets([5]))
+        self.assertEqual(list(so3.get_table()['id']), [5, 4, 3, 2, 1])
+        self.assertEqual(list(so3.get_table().columns), ['id', 'text'])
+
+        # older versions are unchanged
+        self.assertEqual(list(so1.get_table()['id']), [2, 1])
+
+        # chunks of equal size were merged; the newest one was only just written
+        self.assertEqual([rows for filename, type, rows in so2.get_chunks()], [4])
+        self.assertEqual([rows for filename, type, rows in so3.get_chunks()], [1, 4])
+
+        # appending to data stored the usual way converts it
+        so4 = StoredObject.create_table(self.wfm2, tweets([2, 1]))
+        so5 = StoredObject.append_table(self.wfm2, so4, tweets([3]))
+        self.assertEqual(list(so5.get_table()['id']), [3, 2, 1])
+        self.assertEqual([rows for filename, type, rows in so5.get_chunks()], [1, 2])
+        so6 = StoredObject.append_table(self.wfm2, StoredObject.create_table(self.wfm2, tweets([2])), tweets([4, 3]))
+        self.assertEqual([rows for filename, type, rows in so6.get_chunks()], [3])
+
+        # every file written is listed by some version: merges don't leave intermediate files behind
+        listed = set()
+        for so in StoredObject.objects.all():
+            if so.file:
+                listed.add(so.file.name)
+            if so.type == StoredObject.CHUNKED:
+                listed.update(filename for filename, type, rows in so.get_chunks())
+        self.assertEqual(set(default_storage.listdir('')[1]) - files_before - listed, set())
+
+        # chunks are deleted along with the last version listing them
+        chunk_paths = [default_storage.path(filename) for filename, type, rows in so3.get_chunks()]
+        so3.delete()
+        self.assertFalse(os.path.isfile(chunk_paths[0]))
+        self.assertTrue(os.path.isfile(chunk_paths[1]))  # so2's too
+        so2.delete()
+        self.assertFalse(os.path.isfile(chunk_paths[1]))
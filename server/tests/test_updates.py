@@ -0,0 +1,50 @@
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+from datetime import timedelta
+from server.updates import update_wfm_data_scan
+from server.tests.utils import *
+
+class UpdatesTests(TestCase):
+    def setUp(self):
+        self.workflow = add_new_workflow('Workflow 1')
+        self.module_version = add_new_module_version('Module')
+        self.now = timezone.now()
+
+        self.due = add_new_wf_module(self.workflow, self.module_version, 0)
+        self.due.auto_update_data = True
+        self.due.update_interval = 600
+        self.due.next_update = self.now - timedelta(seconds=1500)   # missed two updates
+        self.due.save()
+
+        self.not_due = add_new_wf_module(self.workflow, self.module_version, 1)
+        self.not_due.auto_update_data = True
+        self.not_due.update_interval = 600
+        self.not_due.next_update = self.now + timedelta(seconds=60)
+        self.not_due.save()
+
+        self.no_auto = add_new_wf_module(self.workflow, self.module_version, 2)
+        self.no_auto.next_update = self.now - timedelta(seconds=60)
+        self.no_auto.save()
+
+    def test_update_scan(self):
+        with mock.patch('server.updates.module_dispatch_event') as event:
+            self.assertEqual(update_wfm_data_scan(workers=1), 1)
+            event.assert_called_once_with(mock.ANY, None, None)
+            self.assertEqual(event.call_args[0][0].id, self.due.id)
+
+            # scheduled for the next interval, skipping the missed ones
+            self.due.refresh_from_db()
+            self.assertEqual(self.due.next_update, self.now + timedelta(seconds=300))
+
+            # and not fetched again until then
+            event.reset_mock()
+            self.assertEqual(update_wfm_data_scan(workers=1), 0)
+            self.assertEqual(event.call_count, 0)
+
+    def test_update_error(self):
+        # a failing fetch doesn't stop the scan, or leave the module due
+        with mock.patch('server.updates.module_dispatch_event', side_effect=Exception('boom')):
+            self.assertEqual(update_wfm_data_scan(workers=1), 1)
+        self.due.refresh_from_db()
+        self.assertGreater(self.due.next_update, self.now)
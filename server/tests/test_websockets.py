@@ -6,6 +6,9 @@ from channels.tests import ChannelTestCase, HttpClient
 from server.models import Module, Workflow
 from server.websockets import *
 from server.tests.utils import *
+from unittest import skipUnless
+import os
+import time
 
 class ChannelTests(ChannelTestCase, LoggedInTestCase):
     def setUp(self):
@@ -50,8 +53,56 @@ class ChannelTests(ChannelTestCase, LoggedInTestCase):
 
         # test that utility functions send the right messages
         ws_client_rerender_workflow(self.workflow)
-        self.assertEqual(client.receive(), {'type':'reload-workflow'})
+        ws_flush_workflow_updates()
+        self.assertEqual(client.receive(), {'type':'reload-workflow', 'revision':self.workflow.revision()})
 
         ws_client_wf_module_status(self.wf_module, 'busy')
         self.assertEqual(client.receive(), {'type':'wfmodule-status', 'id':self.wf_module.id, 'status':'busy'})
 
+    def test_coalesce_reloads(self):
+        client = HttpClient()
+        client.send_and_consume('websocket.connect', path='/workflow/' + str(self.wf_id))
+        wf_module2 = add_new_wf_module(self.workflow, self.module, 1)
+
+        # reloads of modules are merged into one message
+        self.wf_module.set_ready()
+        wf_module2.set_error('Oops')
+        self.wf_module.set_is_collapsed(True)
+        ws_flush_workflow_updates()
+        self.assertEqual(client.receive(), {'type': 'reload-workflow',
+                                            'revision': self.workflow.revision(),
+                                            'wf_module_ids': sorted([self.wf_module.id, wf_module2.id])})
+        self.assertIsNone(client.receive())
+
+        # a reload of the whole workflow covers module reloads
+        self.wf_module.set_ready()
+        ws_client_rerender_workflow(self.workflow)
+        ws_flush_workflow_updates()
+        self.assertEqual(client.receive(), {'type': 'reload-workflow', 'revision': self.workflow.revision()})
+        self.assertIsNone(client.receive())
+
+        # and messages go out without flushing, after a moment
+        ws_client_rerender_workflow(self.workflow)
+        time.sleep(BROADCAST_DELAY * 5)
+        self.assertEqual(client.receive(), {'type': 'reload-workflow', 'revision': self.workflow.revision()})
+
+
+# Groups shared between processes. Each RedisChannelLayer stands in for a separate server process.
+# Needs a Redis to talk to, e.g. docker run -p 6379:6379 redis:3, then CJW_TEST_REDIS_HOST=localhost
+@skipUnless('CJW_TEST_REDIS_HOST' in os.environ, 'Set CJW_TEST_REDIS_HOST to test the Redis channel layer')
+class RedisChannelLayerTests(ChannelTestCase):
+    def make_layer(self):
+        from asgi_redis import RedisChannelLayer
+        return RedisChannelLayer(hosts=[(os.environ['CJW_TEST_REDIS_HOST'], 6379)], prefix='cjwtest:')
+
+    def test_group_send_across_processes(self):
+        web_process = self.make_layer()
+        render_process = self.make_layer()
+
+        web_process.group_add(ws_id_to_group(1), 'test.websocket.send')
+        render_process.send_group(ws_id_to_group(1), {'text': '{"type": "reload-workflow"}'})
+        channel, message = web_process.receive(['test.websocket.send'], block=True)
+        self.assertEqual(message, {'text': '{"type": "reload-workflow"}'})
+
+        web_process.group_discard(ws_id_to_group(1), 'test.websocket.send')
+        web_process.flush()
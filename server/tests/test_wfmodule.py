@@ -73,6 +73,34 @@ class WfModuleTests(WfModuleTestsBase):
         self.assertEqual(pval.visible, True)
 
 
+    # parameters are read from a snapshot loaded in one query, once loaded
+    def test_parameter_snapshot(self):
+        for i, pspec in enumerate([self.pspec21, self.pspec22, self.pspec23, self.pspec24, self.pspec25]):
+            pspec.id_name = 'param%d' % i
+            pspec.save()
+        self.wfmodule2.create_default_parameters()
+        wfm = WfModule.objects.get(pk=self.wfmodule2.pk)
+
+        with self.assertNumQueries(1):
+            wfm.load_parameters()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(wfm.get_param_string(self.pspec21.id_name), 'foo')
+            self.assertEqual(wfm.get_param_float(self.pspec22.id_name), 3.14)
+            self.assertEqual(wfm.get_param_integer(self.pspec23.id_name), 42)
+            self.assertEqual(wfm.get_param_checkbox(self.pspec24.id_name), True)
+            self.assertEqual(wfm.get_param_menu_idx(self.pspec25.id_name), 1)
+            self.assertEqual(wfm.get_param_menu_string(self.pspec25.id_name), 'Banana')
+            with self.assertRaises(ValueError):
+                wfm.get_param_integer(self.pspec21.id_name)
+            with self.assertRaises(ValueError):
+                wfm.get_param_string('nonexistent')
+
+        # without a loaded snapshot, we always read current values
+        pval = ParameterVal.objects.get(parameter_spec=self.pspec21, wf_module=self.wfmodule2)
+        pval.set_value('bar')
+        self.assertEqual(self.wfmodule2.get_param_string(self.pspec21.id_name), 'bar')
+
     # test stored versions of data: create, retrieve, set, list, and views
     def test_wf_module_data_versions(self):
         text1 = 'just pretend this is json'
@@ -2,7 +2,8 @@ from django.test import TestCase
 import json
 import pandas as pd
 import io
-from server.views.WfModule import wfmodule_detail, wfmodule_render, wfmodule_dataversion, make_render_json
+from server.views.WfModule import wfmodule_detail, wfmodule_render, wfmodule_dataversion, make_render_json, \
+    json_records_chunks, csv_chunks
 from rest_framework.test import APIRequestFactory
 from rest_framework import status
 from server.models import Module, ModuleVersion, WfModule, Workflow, ParameterSpec, ParameterVal
@@ -97,6 +98,22 @@ class WfModuleTests(LoggedInTestCase, WfModuleTestsBase):
         int64table = pd.read_csv(io.StringIO(int64csv), header=None)
         output = make_render_json(int64table)
 
+    # chunked output must be byte-identical to serializing the whole table at once
+    def test_table_chunks(self):
+        for chunk_rows in [1, 3, 4, 1000]:
+            self.assertEqual(b''.join(json_records_chunks(self.test_table, chunk_rows)),
+                             self.test_table.to_json(orient='records').encode('utf-8'))
+            self.assertEqual(b''.join(csv_chunks(self.test_table, chunk_rows)),
+                             self.test_table.to_csv(index=False).encode('utf-8'))
+
+        # chunks are by position, whatever the index (with a float index, table[a:b] would slice by label)
+        table = self.test_table.set_index(self.test_table.index * 0.5)
+        self.assertEqual(b''.join(csv_chunks(table, 3)), table.to_csv(index=False).encode('utf-8'))
+
+        empty = self.test_table[0:0]
+        self.assertEqual(b''.join(json_records_chunks(empty)), empty.to_json(orient='records').encode('utf-8'))
+        self.assertEqual(b''.join(csv_chunks(empty)), empty.to_csv(index=False).encode('utf-8'))
+
     def test_wf_module_render_get(self):
         # First module: creates test data
         response = self.client.get('/api/wfmodules/%d/render' % self.wfmodule1.id)
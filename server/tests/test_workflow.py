@@ -3,7 +3,7 @@ from server.views import workflow_list, workflow_addmodule, workflow_detail, par
 from server.views.WfModule import wfmodule_detail,wfmodule_render
 from rest_framework.test import APIRequestFactory, force_authenticate
 from rest_framework import status
-from server.models import ParameterVal, ParameterSpec, Module, WfModule, Workflow
+from server.models import ParameterVal, ParameterSpec, Module, WfModule, Workflow, ChangeWorkflowTitleCommand
 from server.tests.utils import *
 import pandas as pd
 import json
@@ -182,6 +182,78 @@ class WorkflowTests(LoggedInTestCase):
         self.assertIs(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+    # serializing must not cost more queries as workflows get bigger
+    def test_workflow_detail_get_query_budget(self):
+        add_new_parameter_spec(self.module_version1, ParameterSpec.STRING, id_name='a', def_value='foo')
+        add_new_parameter_spec(self.module_version1, ParameterSpec.CHECKBOX, id_name='b', order=1, def_value=True)
+        ChangeWorkflowTitleCommand.create(self.workflow1, 'Workflow 1')     # so there is a last_delta
+
+        def get_detail():
+            request = self.factory.get('/api/workflows/%d/' % self.workflow1.id)
+            force_authenticate(request, user=self.user)
+            response = workflow_detail(request, pk=self.workflow1.id)
+            self.assertIs(response.status_code, status.HTTP_200_OK)
+            return response
+
+        for n_modules in [1, 5]:
+            while self.workflow1.wf_modules.count() < n_modules:
+                wfm = add_new_wf_module(self.workflow1, self.module_version1, self.workflow1.wf_modules.count())
+                wfm.create_default_parameters()
+
+            # workflow, modules, parameters
+            with self.assertNumQueries(3):
+                response = get_detail()
+            self.assertEqual(len(response.data['wf_modules']), n_modules)
+            self.assertEqual(response.data['wf_modules'][0]['parameter_vals'][1]['value'], True)
+
+            # then just the workflow, until something changes
+            with self.assertNumQueries(1):
+                get_detail()
+
+    def test_workflow_detail_get_etag(self):
+        wfm = add_new_wf_module(self.workflow1, self.module_version1, 0)
+
+        def get_detail(etag=None):
+            headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+            request = self.factory.get('/api/workflows/%d/' % self.workflow1.id, **headers)
+            force_authenticate(request, user=self.user)
+            return workflow_detail(request, pk=self.workflow1.id)
+
+        response = get_detail()
+        self.assertIs(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = get_detail(etag)
+        self.assertIs(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # status changes aren't new revisions, but they are new responses
+        wfm.set_error('Oops', notify=False)
+        response = get_detail(etag)
+        self.assertIs(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['wf_modules'][0]['error_msg'], 'Oops')
+
+        # so is renaming the owner, whose name is in the response
+        etag = response['ETag']
+        owner = self.workflow1.owner
+        owner.first_name = 'Renamed'
+        owner.save()
+        response = get_detail(etag)
+        self.assertIs(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', response.data['owner_name'])
+
+    def test_workflow_list_get_query_budget(self):
+        for i in range(5):
+            ChangeWorkflowTitleCommand.create(add_new_workflow('Extra %d' % i), 'Extra')
+
+        request = self.factory.get('/api/workflows/')
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(1):
+            response = workflow_list(request)
+        self.assertEqual(len(response.data), 7)
+        self.assertIsNotNone(response.data[6]['last_update'])
+
     def test_workflow_reorder_modules(self):
         wfm1 = add_new_wf_module(self.workflow1, self.module_version1, 0)
         wfm2 = add_new_wf_module(self.workflow1, self.module_version1, 1)
@@ -233,3 +305,53 @@ class WorkflowTests(LoggedInTestCase):
         response = workflow_detail(request,  pk=pk_workflow)
         self.assertIs(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], 'Billy Bob Thornton')
+
+    def test_status_epoch_module_changes(self):
+        # changing a module definition changes the workflows that use it, and only those
+        add_new_wf_module(self.workflow1, self.module_version1)
+        pspec = add_new_parameter_spec(self.module_version1, ParameterSpec.STRING)
+
+        def epochs():
+            return [Workflow.objects.get(pk=w.pk).status_epoch for w in (self.workflow1, self.workflow2)]
+
+        for instance in [self.module_version1, self.module_version1.module, pspec]:
+            before = epochs()
+            instance.save()
+            after = epochs()
+            self.assertNotEqual(after[0], before[0])
+            self.assertEqual(after[1], before[1])
+
+    def test_status_epoch_deletes(self):
+        def epoch():
+            return Workflow.objects.get(pk=self.workflow1.pk).status_epoch
+
+        pspec = add_new_parameter_spec(self.module_version1, ParameterSpec.STRING)
+        wfm = add_new_wf_module(self.workflow1, self.module_version1)
+        wfm.create_default_parameters()
+
+        # deleting a ParameterVal, or the ParameterSpec it came from (initmodules does, reloading a module)
+        before = epoch()
+        ParameterVal.objects.get(wf_module=wfm, parameter_spec=pspec).delete()
+        self.assertNotEqual(epoch(), before)
+
+        wfm.create_default_parameters()
+        before = epoch()
+        pspec.delete()
+        self.assertNotEqual(epoch(), before)
+
+        # detaching the workflow's only module, as DeleteModuleCommand does: once saved it no longer knows its workflow
+        wfm = WfModule.objects.get(pk=wfm.pk)
+        before = epoch()
+        wfm.workflow = None
+        wfm.save()
+        self.assertNotEqual(epoch(), before)
+
+        before = epoch()
+        wfm.workflow = self.workflow1
+        wfm.save()
+        self.assertNotEqual(epoch(), before)
+
+        # deleting a WfModule outright
+        before = epoch()
+        WfModule.objects.get(pk=wfm.pk).delete()
+        self.assertNotEqual(epoch(), before)
@@ -1,26 +1,81 @@
 # Check for updated data
+# Modules with auto_update_data are fetched when their next_update time comes around. Due modules are found through
+# the index on next_update and claimed under row locks that other schedulers skip, so any number of schedulers (see
+# `manage.py runupdates`, and the /runcron view) can run at once without fetching anything twice.
 from server.models import WfModule
 from server.dispatch import module_dispatch_event
+from django.db import connection, transaction
 from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+import logging
 
-# update all modules' data
-def update_wfm_data_scan():
-    for wfm in WfModule.objects.all():
+logger = logging.getLogger('django')
 
-        # only check if an interval has been set (i.e. this module can load data)
-        if wfm.auto_update_data:
-            check_for_wfm_data_update(wfm)
+# Most modules claimed per scheduler pass; the rest wait for the next pass (or another scheduler)
+UPDATE_BATCH_SIZE = 100
 
+# Fetches run at once per scheduler
+UPDATE_WORKERS = 4
 
-# Call this periodically corresponding to smallest possible update cycle (currently every minute)
-def check_for_wfm_data_update(wfm):
-    now = timezone.now()
-    if now > wfm.next_update:
+# For modules with auto update on but no interval set
+DEFAULT_UPDATE_INTERVAL = 60 * 60
+
+
+# Move next_update past now, skipping missed updates if any
+def schedule_next_update(wfm, now):
+    interval = timedelta(seconds=wfm.update_interval if wfm.update_interval > 0 else DEFAULT_UPDATE_INTERVAL)
+    missed = (now - wfm.next_update) // interval
+    wfm.next_update += interval * (missed + 1)
+
+
+# Lock due modules, skipping any another scheduler has locked, and schedule their next updates. Once we commit they
+# are no longer due, so they are ours to fetch: the new next_update is our lease.
+def claim_due_wfmodules(now, limit=UPDATE_BATCH_SIZE):
+    with transaction.atomic():
+        wfms = list(WfModule.objects.select_for_update(skip_locked=True)
+                                    .filter(auto_update_data=True, next_update__lte=now)
+                                    .order_by('next_update')[:limit])
+        for wfm in wfms:
+            schedule_next_update(wfm, now)
+            wfm.save(update_fields=['next_update'])
+    return wfms
+
+
+def fetch_wfm_data(wfm):
+    try:
         module_dispatch_event(wfm, None, None)  # None=no parameter, None = no event, wasn't a user button press
+    except Exception:
+        # one broken module or site shouldn't stop everyone else's updates
+        logger.exception('Error updating data for wf_module %d' % wfm.id)
+
+
+def fetch_wfm_data_in_thread(wfm):
+    try:
+        fetch_wfm_data(wfm)
+    finally:
+        connection.close()  # each pool thread opened its own connection
+
+
+# Claim and fetch everything that is due. Returns the number of modules fetched.
+# With workers=1, fetches happen one at a time in the calling thread.
+def update_wfm_data_scan(workers=UPDATE_WORKERS):
+    wfms = claim_due_wfmodules(timezone.now())
+
+    if workers <= 1:
+        for wfm in wfms:
+            fetch_wfm_data(wfm)
+    elif wfms:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fetch_wfm_data_in_thread, wfms))
+
+    return len(wfms)
 
-        # schedule next update, skipping missed updates if any
-        while (wfm.next_update <= now):
-            wfm.next_update += timedelta(seconds=wfm.update_interval)
-        wfm.save()
 
+# Seconds until the next module is due, or None if no module has auto update on
+def seconds_until_next_update():
+    next_update = WfModule.objects.filter(auto_update_data=True, next_update__isnull=False) \
+                                  .order_by('next_update').values_list('next_update', flat=True).first()
+    if next_update is None:
+        return None
+    return max(0, (next_update - timezone.now()).total_seconds())
@@ -0,0 +1,32 @@
+# Compiling and defining user-entered Python (formulas, Python Code modules)
+# No Django here: sandbox workers import this without loading models or settings.
+
+from functools import lru_cache
+import math
+import pandas as pd
+import numpy as np
+
+# Utility class: globals defined for user-entered python code
+custom_code_globals = {
+    '__builtins__': {},  # disallow import etc. (though still not impossible!)
+    'str': str,
+    'math' : math,
+    'pd' : pd,
+    'np' : np
+}
+
+# Compiled user code (formulas, Python Code modules) keyed by source text, so repeat renders skip parse and compile.
+# Errors aren't cached, so bad code is recompiled each time (and reports its error each time).
+USER_CODE_CACHE_SIZE = 256
+
+@lru_cache(maxsize=USER_CODE_CACHE_SIZE)
+def compile_user_code(source, mode):
+    return compile(source, '<string>', mode)
+
+# Run user source that defines a function in the custom_code_globals sandbox, return the function (or None if the
+# source doesn't define it). The function object is shared by all renders of the same source.
+@lru_cache(maxsize=USER_CODE_CACHE_SIZE)
+def define_user_function(source, name):
+    locals = {}
+    exec(compile_user_code(source, 'exec'), custom_code_globals, locals)
+    return locals.get(name)
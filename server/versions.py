@@ -1,6 +1,7 @@
 # Undo, redo, and other version related things
 from server.models import Delta, Workflow
 from server.websockets import *
+from server.renderqueue import queue_render
 
 # Undo is pretty much just running workflow.last_delta backwards
 def WorkflowUndo(workflow):
@@ -37,7 +38,7 @@ def WorkflowRedo(workflow):
         notify_client_workflow_version_changed(workflow)
 
 
-# Trigger re-render on client side
+# Trigger re-render on client side. Clients are told to reload by the render worker, once the new output is ready.
 def notify_client_workflow_version_changed(workflow):
-    ws_client_rerender_workflow(workflow)
+    queue_render(workflow)
 
@@ -1,12 +1,14 @@
 from rest_framework import viewsets, renderers
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import FormParser, MultiPartParser
 from django.http import HttpResponse
 from server.serializers import StoredObjectSerializer
 from server.models import StoredObject
-from server.forms import StoredObjectForm
+from server.forms import StoredObjectForm, UploadPartForm, UploadDoneForm
+from server.chunkedupload import save_part, assemble_parts, delete_parts, delete_abandoned_parts
 from server.versions import notify_client_workflow_version_changed
 from server.models import ChangeDataVersionCommand
+from server.modules.uploadfile import UploadFile
 
 import json
 import logging
@@ -23,20 +25,57 @@ logger = logging.getLogger('django')
 
 class StoredObjectView(APIView):
     renderer_classes = [renderers.JSONRenderer]
-    parser_classes = (MultiPartParser,)
+    parser_classes = (MultiPartParser, FormParser)  # chunked upload "done" requests are url-encoded
 
     def post(self, request, format=None):
+        # Big files come in parts (see server/chunkedupload.py)
+        if 'qqpartindex' in request.POST:
+            return self.post_part(request)
+        if 'qqtotalparts' in request.POST:
+            return self.post_done(request)
+
         form = StoredObjectForm(request.POST, request.FILES)
         if form.is_valid():
-            new_stored_object = form.save()
-            ChangeDataVersionCommand.create(new_stored_object.wf_module, new_stored_object.stored_at)
+            # Parse the file now, once, and store the table; renders then read the table instead of the file
+            upload = form.save(commit=False)
+            try:
+                table = UploadFile.parse_file(upload.file.name, upload.file)
+            except ValueError as e:
+                return make_error_response(str(e))
+
+            store_upload(upload.wf_module, table, upload.name, upload.size, upload.uuid)
             return make_response(content=json.dumps({'success': True}))
         else:
-            return make_response(status=400,
-                                 content=json.dumps({
-                                     'success': False,
-                                     'error': '%s' % repr(form.errors)
-                                 }))
+            return make_error_response(repr(form.errors))
+
+    def post_part(self, request):
+        form = UploadPartForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return make_error_response(repr(form.errors))
+
+        if form.cleaned_data['qqpartindex'] == 0:
+            delete_abandoned_parts()  # now and then is enough
+        save_part(form.cleaned_data['uuid'], form.cleaned_data['qqpartindex'], form.cleaned_data['file'])
+        return make_response(content=json.dumps({'success': True}))
+
+    def post_done(self, request):
+        form = UploadDoneForm(request.POST)
+        if not form.is_valid():
+            return make_error_response(repr(form.errors))
+
+        upload_uuid = form.cleaned_data['uuid']
+        name = form.cleaned_data['name']
+        try:
+            path = assemble_parts(upload_uuid, form.cleaned_data['qqtotalparts'])
+            with open(path, 'rb') as file:
+                table = UploadFile.parse_file(name, file)
+        except ValueError as e:
+            return make_error_response(str(e))
+        finally:
+            delete_parts(upload_uuid)
+
+        store_upload(form.cleaned_data['wf_module'], table, name, form.cleaned_data['size'], str(upload_uuid))
+        return make_response(content=json.dumps({'success': True}))
 
     def get(self, request, *args, **kwargs):
         wf_module = request.GET.get('wf_module', '')
@@ -74,6 +113,22 @@ class StoredObjectView(APIView):
 ##
 # Utils
 ##
+# Store the table parsed from an uploaded file as the module's new data version
+def store_upload(wf_module, table, name, size, uuid):
+    stored_object = StoredObject.create_table(wf_module, table)
+    stored_object.name = name
+    stored_object.size = size
+    stored_object.uuid = uuid
+    stored_object.save()
+    ChangeDataVersionCommand.create(wf_module, stored_object.stored_at)
+
+def make_error_response(error):
+    return make_response(status=400,
+                         content=json.dumps({
+                             'success': False,
+                             'error': error
+                         }))
+
 def make_response(status=200, content_type='text/plain', content=None):
     """ Construct a response to an upload request.
     Success is indicated by a status of 200 and { "success": true }
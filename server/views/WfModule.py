@@ -1,4 +1,4 @@
-from django.http import HttpResponse, HttpResponseNotFound, HttpResponseForbidden
+from django.http import HttpResponse, StreamingHttpResponse, HttpResponseNotFound, HttpResponseForbidden
 from rest_framework import status
 from rest_framework.decorators import api_view, renderer_classes, permission_classes
 from rest_framework.response import Response
@@ -6,7 +6,7 @@ from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from server.models import WfModule
 from server.serializers import WfModuleSerializer
-from server.execute import execute_wfmodule
+from server.execute import execute_wfmodule, execute_wfmodule_window, clip_rows
 from django.utils import timezone
 from server.models import DeleteModuleCommand, ChangeDataVersionCommand, ChangeWfModuleNotesCommand, ChangeWfModuleUpdateSettingsCommand
 from datetime import timedelta
@@ -83,19 +83,41 @@ def wfmodule_detail(request, pk, format=None):
 # ---- render / input / livedata ----
 # These endpoints return actual table data
 
-# Helper method that produces json output for a table + start/end row
+# Rows per chunk when streaming table data. Windows that fit in one chunk are sent as a plain response.
+STREAM_CHUNK_ROWS = 1000
+
+# Generates a table as a json array of records, a chunk of rows at a time, so we never hold more than one chunk's
+# worth of json in memory. Byte-identical to table.to_json(orient='records')
+def json_records_chunks(table, chunk_rows=STREAM_CHUNK_ROWS):
+    if len(table) == 0:
+        yield table.to_json(orient='records').encode('utf-8')
+        return
+
+    separator = b'['
+    for start in range(0, len(table), chunk_rows):
+        chunk = table.iloc[start:start + chunk_rows].to_json(orient='records').encode('utf-8')
+        yield separator + chunk[1:-1]  # strip the chunk's own [ ], we're building one big array
+        separator = b','
+    yield b']'
+
+# Generates a table as csv, a chunk of rows at a time. Byte-identical to table.to_csv(index=False)
+def csv_chunks(table, chunk_rows=STREAM_CHUNK_ROWS):
+    if len(table) == 0:
+        yield table.to_csv(index=False).encode('utf-8')
+        return
+
+    for start in range(0, len(table), chunk_rows):
+        yield table.iloc[start:start + chunk_rows].to_csv(index=False, header=(start == 0)).encode('utf-8')
+
+# Helper method that produces json output for a table + start/end row, as a generator of chunks
 # Also silently clips row indices
-def make_render_json(table, startrow=None, endrow=None):
+def render_json_chunks(table, startrow=None, endrow=None):
     nrows = len(table)
-    if startrow is None:
-        startrow = 0
-    if endrow is None:
-        endrow = nrows
-
-    startrow = max(0, startrow)
-    endrow = min(nrows, endrow)
-    table = table[startrow:endrow]
+    startrow, endrow = clip_rows(nrows, startrow, endrow)
+    return render_window_json_chunks(table[startrow:endrow], nrows, startrow, endrow)
 
+# Same, but for a window of rows already sliced out of a table of nrows rows
+def render_window_json_chunks(table, nrows, startrow, endrow):
     # in a sane and just world, we could now just do something like
     #  rows = table.to_dict(orient='records')
     # and then insert these rows into a dict with the rest of the fields we need,
@@ -104,13 +126,23 @@ def make_render_json(table, startrow=None, endrow=None):
 
     # The workaround is to usr table.to_json to get a string, and then glue the other
     # fields we want around that string. Like savages.
-    rowstr = table.to_json(orient="records").encode('utf-8')
     colnames = list(table.columns.astype(str)) # Don't want int64 column names. Can get that from CSV with no header row
     colstr = json.dumps(colnames, ensure_ascii=False).encode('utf-8')
-    outfmt =  b'{"total_rows": %d, "start_row" :%d, "end_row": %d, "columns": %s, "rows": %s}'
-    outstr = outfmt % (nrows, startrow, endrow, colstr, rowstr)
+    outfmt =  b'{"total_rows": %d, "start_row" :%d, "end_row": %d, "columns": %s, "rows": '
+    yield outfmt % (nrows, startrow, endrow, colstr)
+    yield from json_records_chunks(table)
+    yield b'}'
+
+# Whole render json as one bytes object
+def make_render_json(table, startrow=None, endrow=None):
+    return b''.join(render_json_chunks(table, startrow, endrow))
 
-    return outstr
+# Stream responses bigger than a chunk, so we don't build several full copies of a large table in memory
+def make_table_response(chunks, nrows, content_type):
+    if nrows > STREAM_CHUNK_ROWS:
+        return StreamingHttpResponse(chunks, content_type=content_type)
+    else:
+        return HttpResponse(b''.join(chunks), content_type=content_type)
 
 def int_or_none(x):
     return int(x) if x is not None else None
@@ -124,9 +156,11 @@ def table_result(request, wf_module):
     except ValueError:
         return Response({'message': 'bad row number', 'status_code': 400}, status=status.HTTP_400_BAD_REQUEST)
 
-    table = execute_wfmodule(wf_module)
-    j = make_render_json(table, startrow, endrow)
-    return HttpResponse(j, content_type="application/json")
+    # Only the requested rows are loaded and serialized; total_rows comes from the cache's metadata
+    window, total_rows = execute_wfmodule_window(wf_module, startrow, endrow)
+    startrow, endrow = clip_rows(total_rows, startrow, endrow)
+    return make_table_response(render_window_json_chunks(window, total_rows, startrow, endrow), len(window),
+                               "application/json")
 
 
 # /render: return output table of this module
@@ -183,11 +217,9 @@ def wfmodule_public_output(request, pk, type, format=None):
 
     table = execute_wfmodule(wf_module)
     if type=='json':
-        d = table.to_json(orient='records')
-        return HttpResponse(d, content_type="application/json")
+        return make_table_response(json_records_chunks(table), len(table), "application/json")
     elif type=='csv':
-        d = table.to_csv(index=False)
-        return HttpResponse(d, content_type="text/csv")
+        return make_table_response(csv_chunks(table), len(table), "text/csv")
     else:
         return HttpResponseNotFound()
 
@@ -7,10 +7,8 @@ from server.updates import update_wfm_data_scan
 def runcron(request):
 
     # This could take a long time, because it can download data for every module.
-    # Fortunately django channels distributes requests across workers (4 by default).
-    # But if this takes more than 1 minute, we could end up with multiple workers
-    # checking for updates at once. Will db locks take care of us if so?
+    # Overlapping runs are safe: each module is claimed by exactly one run (see server/updates.py).
+    # `manage.py runupdates` does the same job without the cron job, and fetches modules as soon as they're due.
     update_wfm_data_scan()
 
     return HttpResponse(status=204) # no content
-
@@ -9,11 +9,14 @@ from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer
-from server.models import Module, ModuleVersion, Workflow, WfModule
+from server.models import Module, ModuleVersion, Workflow, WfModule, ParameterVal
 from server.models import AddModuleCommand, ReorderModulesCommand, ChangeWorkflowTitleCommand
 from server.serializers import WorkflowSerializer, WorkflowSerializerLite, UserSerializer
 from server.versions import WorkflowUndo, WorkflowRedo
-from django.db.models import Q
+from server.utils import user_display
+from django.db.models import Q, Prefetch, prefetch_related_objects
+from django.core.cache import cache
+import hashlib
 import json
 
 # ---- Workflows list page ----
@@ -35,12 +38,44 @@ def render_workflow(request, pk=None):
 
 # ---- Workflow ----
 
+# Everything the serializers follow, so serializing costs a fixed number of queries however many modules there are:
+# the workflow with its owner and last delta, then all its modules with their versions, then all their parameters.
+WORKFLOW_RELATED = ('owner', 'last_delta')
+WORKFLOW_PREFETCH = (
+    Prefetch('wf_modules', queryset=WfModule.objects.select_related('module_version__module')),
+    Prefetch('wf_modules__parameter_vals', queryset=ParameterVal.objects.select_related('parameter_spec')),
+)
+
+# Serialized workflows are cached under everything that can change them, so every viewer of a workflow shares one
+# serialization per change. Entries for old revisions are never requested again, and just expire.
+WORKFLOW_JSON_CACHE_TIMEOUT = 10 * 60
+
+# The owner's name is in the JSON too, and renaming a user doesn't touch their workflows
+def workflow_json_cache_key(workflow, read_only):
+    owner_hash = hashlib.sha1(user_display(workflow.owner).encode('utf-8')).hexdigest()
+    return 'workflow-json-%d-%d-%s-%d-%s' % (workflow.id, workflow.revision(), workflow.status_epoch, read_only,
+                                             owner_hash)
+
+def workflow_json(workflow, user):
+    read_only = workflow.read_only(user)
+    key = workflow_json_cache_key(workflow, read_only)
+    data = cache.get(key)
+    if data is None:
+        prefetch_related_objects([workflow], *WORKFLOW_PREFETCH)
+        data = WorkflowSerializer(workflow, context={'user': user}).data
+        cache.set(key, data, WORKFLOW_JSON_CACHE_TIMEOUT)
+    return data
+
+def workflow_etag(workflow, user):
+    key = workflow_json_cache_key(workflow, workflow.read_only(user))
+    return '"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
 # List all workflows, or create a new workflow.
 @api_view(['GET', 'POST'])
 @renderer_classes((JSONRenderer,))
 def workflow_list(request, format=None):
     if request.method == 'GET':
-        workflows = Workflow.objects.filter(Q(owner=request.user))
+        workflows = Workflow.objects.filter(Q(owner=request.user)).select_related('last_delta')
         serializer = WorkflowSerializerLite(workflows, many=True)
         return Response(serializer.data)
 
@@ -59,7 +94,7 @@ def workflow_list(request, format=None):
 @permission_classes((IsAuthenticatedOrReadOnly, ))
 def workflow_detail(request, pk, format=None):
     try:
-        workflow = Workflow.objects.get(pk=pk)
+        workflow = Workflow.objects.select_related(*WORKFLOW_RELATED).get(pk=pk)
     except Workflow.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -67,8 +102,15 @@ def workflow_detail(request, pk, format=None):
         return Response(status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'GET':
-        serializer = WorkflowSerializer(workflow, context={'user' : request.user})
-        return Response(serializer.data)
+        # Clients refetch after every change notification; if nothing they can see has changed, say so
+        etag = workflow_etag(workflow, request.user)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(workflow_json(workflow, request.user))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'     # always revalidate; read_only depends on the user
+        return response
 
     # We use PATCH to set the order of the modules when the user drags.
     elif request.method == 'PATCH':
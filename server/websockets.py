@@ -1,6 +1,7 @@
 # Receive and send websockets messages.
 # Clients open a socket on a specific workflow, and all clients viewing that workflow are a "group"
 import json
+import threading
 from channels import Group
 from server.models import Workflow
 from server.models.WfModule import ws_callbacks
@@ -39,10 +40,67 @@ def ws_send_workflow_update(workflow, message_dict):
     # print("Sending message to " + str(workflow.id) + ": " + str(message_dict))
     Group(ws_id_to_group(workflow.id)).send({'text' : json.dumps(message_dict)}, immediately=True)
 
-# Tell clients to reload entire workflow
-def ws_client_rerender_workflow(workflow):
-    message = { 'type': 'reload-workflow'}
-    ws_send_workflow_update(workflow, message)
+# ---- Coalesced reloads ----
+# One render or edit can change many modules in quick succession, and every reload message makes every client
+# refetch. So reload messages wait a moment, and all the reloads for a workflow in that window go out as one message
+# carrying the latest revision and the ids of the modules that changed (or no ids, meaning reload everything).
+
+BROADCAST_DELAY = 0.1   # seconds
+
+class ReloadCoalescer:
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.pending = {}   # workflow id -> {'revision': int, 'wf_module_ids': set, or None for all}
+        self.timers = {}    # workflow id -> threading.Timer that will send its message
+
+    def add(self, workflow_id, revision, wf_module_ids):
+        with self.lock:
+            pending = self.pending.get(workflow_id)
+            if pending is None:
+                pending = self.pending[workflow_id] = {'revision': revision, 'wf_module_ids': set()}
+                timer = threading.Timer(self.delay, self.send, [workflow_id])
+                timer.daemon = True
+                self.timers[workflow_id] = timer
+                timer.start()
+
+            pending['revision'] = max(pending['revision'], revision)
+            if wf_module_ids is None:
+                pending['wf_module_ids'] = None
+            elif pending['wf_module_ids'] is not None:
+                pending['wf_module_ids'].update(wf_module_ids)
+
+    # Send the pending message for a workflow, if there is one
+    def send(self, workflow_id):
+        with self.lock:
+            pending = self.pending.pop(workflow_id, None)
+            timer = self.timers.pop(workflow_id, None)
+        if timer is not None:
+            timer.cancel()      # no-op if we are the timer
+        if pending is None:
+            return
+
+        message = {'type': 'reload-workflow', 'revision': pending['revision']}
+        if pending['wf_module_ids'] is not None:
+            message['wf_module_ids'] = sorted(pending['wf_module_ids'])
+        Group(ws_id_to_group(workflow_id)).send({'text': json.dumps(message)}, immediately=True)
+
+    # Send everything now, rather than when the timers fire
+    def flush(self):
+        with self.lock:
+            workflow_ids = list(self.pending.keys())
+        for workflow_id in workflow_ids:
+            self.send(workflow_id)
+
+reload_coalescer = ReloadCoalescer(BROADCAST_DELAY)
+
+# Tell clients to reload the workflow, or just the given modules if it's only their state that changed
+def ws_client_rerender_workflow(workflow, wf_module_ids=None):
+    reload_coalescer.add(workflow.id, workflow.revision(), wf_module_ids)
+
+# Send all waiting reload messages immediately
+def ws_flush_workflow_updates():
+    reload_coalescer.flush()
 
 # Tell clients to reload specific wfmodule
 def ws_client_wf_module_status(wf_module, status):
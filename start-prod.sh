@@ -7,6 +7,7 @@
 export CJW_PRODUCTION=True
 export CJW_DB_HOST=cjw-db  # name of docker-compose container
 export CJW_DB_PASSWORD=cjworkbench
+export CJW_REDIS_HOST=cjw-redis  # channel layer, shared by all server processes
 
 # required or we won't get any logs when running in docker container
 export PYTHONUNBUFFERED=0
@@ -15,5 +16,6 @@ export PYTHONUNBUFFERED=0
 cron
 
 python manage.py migrate
+python manage.py createcachetable
 python manage.py runserver --insecure 0.0.0.0:8000
 